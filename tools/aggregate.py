@@ -0,0 +1,161 @@
+r"""
+Counts observations grouped several ways at once, in one pass over the rows.
+
+A Dimension says how to group a row (its keys) and what to count: either
+the rows themselves, or the distinct values of something (e.g., the number
+of distinct dates, i.e., observing sessions, per month).
+
+Example:
+    counts = aggregate(read_observations("../data/observations.tsv"),
+                       [BY_MONTH, SESSIONS_BY_MONTH, BY_SCOPE])
+    print(counts["scope"].most_common(3))
+"""
+import datetime
+import hashlib
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Callable, Counter, DefaultDict, Dict, Hashable, Iterable, List, Optional, Set
+
+from tsv_tables import ObservationRow
+from tsv_tables import parse_obj_ids
+from tsv_tables import read_objects
+
+KeyFunction = Callable[[ObservationRow], List[Hashable]]
+
+
+@dataclass
+class Dimension:
+    """A way of grouping observations.
+
+    keys returns the groups a row belongs to (none, one or several).  If
+    distinct is set, each group counts the distinct values it returns
+    instead of the number of rows.  Charts show groups in key order, or by
+    decreasing count if by_count is set, using label to name them.
+    data_version identifies any other data keys depends on (e.g., a hash
+    of the object table), so saved counts are not reused if it changes.
+    """
+    name: str
+    keys: KeyFunction
+    distinct: Optional[Callable[[ObservationRow], Hashable]] = None
+    label: Callable[[Hashable], str] = str
+    by_count: bool = False
+    data_version: str = ""
+
+
+class Aggregator:
+    """Accumulates the counts for several dimensions as rows are added."""
+
+    def __init__(self, dimensions: List[Dimension]):
+        self.dimensions = dimensions
+        self.row_counts: Dict[str, Counter[Hashable]] = {d.name: Counter() for d in dimensions}
+        self.distinct_values: Dict[str, DefaultDict[Hashable, Set[Hashable]]] = {
+            d.name: defaultdict(set) for d in dimensions if d.distinct is not None}
+
+    def add(self, row: ObservationRow) -> None:
+        for d in self.dimensions:
+            keys = d.keys(row)
+            if not keys:
+                continue
+            if d.distinct is None:
+                counts = self.row_counts[d.name]
+                for k in keys:
+                    counts[k] += 1
+            else:
+                value = d.distinct(row)
+                values = self.distinct_values[d.name]
+                for k in keys:
+                    values[k].add(value)
+
+    def to_json(self) -> Any:
+        """The counts so far, in a form json can store (see from_json)."""
+        return {"counts": {name: [[k, c] for k, c in counts.items()]
+                           for name, counts in self.row_counts.items()},
+                "distinct": {name: [[k, list(v)] for k, v in values.items()]
+                             for name, values in self.distinct_values.items()}}
+
+    @staticmethod
+    def from_json(dimensions: List[Dimension], saved: Any) -> "Aggregator":
+        aggregator = Aggregator(dimensions)
+        for name, counts in saved["counts"].items():
+            aggregator.row_counts[name].update({as_key(k): c for k, c in counts})
+        for name, values in saved["distinct"].items():
+            for k, v in values:
+                aggregator.distinct_values[name][as_key(k)].update(as_key(x) for x in v)
+        return aggregator
+
+    def counts(self, name: str) -> Counter[Hashable]:
+        if name in self.distinct_values:
+            return Counter({k: len(v) for k, v in self.distinct_values[name].items()})
+        return self.row_counts[name]
+
+
+def as_key(value: Any) -> Hashable:
+    """Changes the lists json makes of tuple keys back to tuples."""
+    if isinstance(value, list):
+        return tuple(as_key(v) for v in value)
+    return value
+
+
+def aggregate(rows: Iterable[ObservationRow], dimensions: List[Dimension]) -> Dict[str, Counter[Hashable]]:
+    """Counts the rows along every dimension in a single pass."""
+    aggregator = Aggregator(dimensions)
+    for row in rows:
+        aggregator.add(row)
+    return {d.name: aggregator.counts(d.name) for d in dimensions}
+
+
+def parse_ymd(date: str) -> Optional[datetime.date]:
+    """Changes a date like 2019-01-29 to a date, or None if not a valid date."""
+    match = re.match(r"(\d\d\d\d)-(\d\d)-(\d\d)$", date)
+    if not match:
+        return None
+    try:
+        return datetime.date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+    except ValueError:
+        return None
+
+
+def year_month(row: ObservationRow) -> List[Hashable]:
+    date = parse_ymd(row.date)
+    return [(date.year, date.month)] if date else []
+
+
+def weekday(row: ObservationRow) -> List[Hashable]:
+    date = parse_ymd(row.date)
+    return [date.weekday()] if date else []
+
+
+def hour(row: ObservationRow) -> List[Hashable]:
+    match = re.match(r"(\d+):\d\d", row.time)
+    return [int(match.group(1))] if match else []
+
+
+def field_value(field_name: str) -> KeyFunction:
+    """Groups by the value of a field, skipping rows where it is empty."""
+    def keys(row: ObservationRow) -> List[Hashable]:
+        value = getattr(row, field_name)
+        return [value] if value else []
+    return keys
+
+
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+BY_MONTH = Dimension("month", year_month)
+SESSIONS_BY_MONTH = Dimension("sessions by month", year_month, distinct=lambda row: row.date)
+BY_SCOPE = Dimension("scope", field_value("scope"), by_count=True)
+BY_LOCATION = Dimension("location", field_value("location"), by_count=True)
+BY_SEEING = Dimension("seeing", field_value("seeing"))
+BY_TRANSPARENCY = Dimension("transparency", field_value("transparency"))
+BY_WEEKDAY = Dimension("weekday", weekday, label=lambda d: WEEKDAYS[d])
+BY_HOUR = Dimension("hour", hour)
+
+
+def by_object_type(obj_file: str) -> Dimension:
+    """Groups observations by the main type of each object they list."""
+    main_types = {row.obj_id: row.obj_type.split('+')[0] for row in read_objects(obj_file)}
+    version = hashlib.sha1(repr(sorted(main_types.items())).encode('utf-8')).hexdigest()
+
+    def keys(row: ObservationRow) -> List[Hashable]:
+        return [main_types[obj_id] for obj_id in parse_obj_ids(row.obj_ids) if obj_id in main_types]
+    return Dimension("object type", keys, by_count=True, data_version=version)
@@ -0,0 +1,106 @@
+r"""
+Runs the tools as subcommands of one command:
+    validate    validate_observations.py
+    sort        sort_objects.py
+    progress    progress.py
+    frequency   gen_frequency_charts.py
+    chart       skyplot/chart_generator.py
+Each subcommand takes the same options as its script, e.g.:
+python3 astrodb_tools.py validate -d ../data/observations.tsv
+python3 astrodb_tools.py chart -h
+
+Several subcommands can be run at once, separated by "+".  Python and the
+libraries then start only once, and parsed files are kept for the later
+subcommands (e.g. two charts read the star catalog once).  The options of
+every subcommand are checked before any of them runs:
+python3 astrodb_tools.py \
+    validate -d ../data/observations.tsv + \
+    frequency -d ../data/observations.tsv -o obs.png -s sessions.png + \
+    progress -p ../data/programs.tsv -a -o programs.pdf
+
+A subcommand's module, and the libraries it needs (matplotlib, cairo), are
+only imported if it is run.
+"""
+import importlib
+import os
+import sys
+from typing import List, NamedTuple
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+SKYPLOT_DIR = os.path.join(TOOLS_DIR, "skyplot")
+
+SEPARATOR = "+"
+
+
+class Command(NamedTuple):
+    module: str
+    description: str
+    # whether its main keeps parsed data in a WarmData
+    warm: bool
+
+
+COMMANDS = {
+    "validate": Command("validate_observations", "check the rows of observations.tsv", False),
+    "sort": Command("sort_objects", "sort objects.tsv", False),
+    "progress": Command("progress", "graph progress through observing programs", True),
+    "frequency": Command("gen_frequency_charts", "chart observations and sessions by month", True),
+    "chart": Command("chart_generator", "plot objects on star charts", True),
+}
+
+
+def usage() -> str:
+    lines = ["usage: astrodb_tools.py COMMAND [options] [+ COMMAND [options] ...]", "",
+             "commands (run 'astrodb_tools.py COMMAND -h' for a command's options):"]
+    for name, command in COMMANDS.items():
+        lines.append("  {:10s}  {}".format(name, command.description))
+    return "\n".join(lines)
+
+
+def split_commands(argv: List[str]) -> List[List[str]]:
+    """Splits the arguments at each SEPARATOR."""
+    groups = [[]]
+    for arg in argv:
+        if arg == SEPARATOR:
+            groups.append([])
+        else:
+            groups[-1].append(arg)
+    return groups
+
+
+def load(name: str):
+    if name == "chart" and SKYPLOT_DIR not in sys.path:
+        sys.path.append(SKYPLOT_DIR)
+    return importlib.import_module(COMMANDS[name].module)
+
+
+def run(argv: List[str]) -> None:
+    groups = split_commands(argv)
+    if groups == [[]] or groups[0][0] in ["-h", "--help"]:
+        print(usage())
+        return
+    for group in groups:
+        if not group or group[0] not in COMMANDS:
+            sys.exit(usage() + "\n\nastrodb_tools.py: error: unknown command '{}'".format(
+                group[0] if group else ""))
+
+    # check every command's options before running any of them
+    parsed = []
+    for group in groups:
+        name = group[0]
+        module = load(name)
+        options = module.parse_options(group[1:], prog="astrodb_tools.py " + name)
+        parsed.append((name, module, options))
+
+    data = None
+    if any(COMMANDS[name].warm for name, _, _ in parsed):
+        from watch import WarmData
+        data = WarmData()
+    for name, module, options in parsed:
+        if COMMANDS[name].warm:
+            module.main(options, data)
+        else:
+            module.main(options)
+
+
+if __name__ == "__main__":
+    run(sys.argv[1:])
@@ -0,0 +1,294 @@
+r"""
+Times the tools on synthetic data, at several multiples of the real data's size.
+
+For each scale, the data is generated (see synthetic_data.py) into a
+directory under --data_dir, then each stage is run and its wall time,
+throughput (input rows per second) and peak Python memory (measured with
+tracemalloc in a separate run, as tracing slows the code down) are printed.
+Single timings are noisy, so each stage is run --repeat times, and more
+until the runs add up to --min_time seconds, and the fastest run is kept.
+Every result is appended to a JSONL file, and compared with the previous
+run's result for the same stage and scale.  A stage is flagged as a
+regression only if it slowed down by more than --threshold and by more
+than --min_difference seconds.
+
+Stages needing cairo (the frequency counts and the star charts) are
+skipped if it is not installed.
+
+Usage:
+python3 benchmark.py -s 1,10,100
+python3 benchmark.py -s 10 --stages read_star_data,read_dso_data --no_memory
+"""
+import contextlib
+import datetime
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict
+from dataclasses import dataclass
+from optparse import OptionParser
+from typing import Callable, Dict, List, Optional, Tuple
+
+from synthetic_data import generate
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(TOOLS_DIR, "skyplot"))
+
+
+@dataclass
+class Result:
+    run: str
+    commit: str
+    stage: str
+    scale: int
+    rows: int
+    seconds: float
+    rows_per_second: float
+    peak_mb: Optional[float]
+
+
+@dataclass
+class Paths:
+    objects: str
+    observations: str
+    programs: str
+    sky_dir: str
+    work_dir: str
+
+    @property
+    def stars(self) -> str:
+        return os.path.join(self.sky_dir, "stars.tsv")
+
+    @property
+    def milky_way(self) -> str:
+        return os.path.join(self.sky_dir, "milkyway.json")
+
+
+def count_rows(tsv_file: str) -> int:
+    with open(tsv_file, 'r') as f:
+        return sum(1 for line in f if line.strip() and not line.startswith('#'))
+
+
+# Each stage returns a function doing the work (after any untimed setup)
+# and the number of input rows it handles.
+Stage = Callable[[Paths], Tuple[Callable[[], object], int]]
+
+
+def read_star_data_stage(paths: Paths):
+    from star import parse_star_file
+    return (lambda: parse_star_file(paths.stars), count_rows(paths.stars))
+
+
+def load_star_cache_stage(paths: Paths):
+    from star import read_star_data
+    read_star_data(paths.stars)  # make the cache
+    return (lambda: read_star_data(paths.stars), count_rows(paths.stars))
+
+
+def read_dso_data_stage(paths: Paths):
+    from dso import read_dso_data
+    return (lambda: read_dso_data(paths.objects), count_rows(paths.objects))
+
+
+def read_milky_way_stage(paths: Paths):
+    from milkyway import read_milky_way
+    with open(paths.milky_way, 'r') as mfile:
+        features = json.load(mfile)["features"]
+    # the "rows" are the outline points
+    num_points = sum(len(ring) for f in features
+                     for polygon in f["geometry"]["coordinates"] for ring in polygon)
+    return (lambda: read_milky_way(paths.milky_way, use_cache=False), num_points)
+
+
+def extract_counts_stage(paths: Paths):
+    from gen_frequency_charts import extract_counts
+    return (lambda: extract_counts(paths.observations), count_rows(paths.observations))
+
+
+def validate_observations_stage(paths: Paths):
+    from validate_observations import validate_observations
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return validate_observations(paths.observations, full=True)
+    return (run, count_rows(paths.observations))
+
+
+def sort_objects_stage(paths: Paths):
+    from sort_objects import write_sorted
+    return (lambda: write_sorted(paths.objects, io.StringIO(), 100000, paths.work_dir),
+            count_rows(paths.objects))
+
+
+def chart_stage(output_format: str) -> Stage:
+    def stage(paths: Paths):
+        from sky_data import load_sky_data
+        from star_chart import StarPlot
+        sky = load_sky_data(paths.sky_dir, paths.objects)
+        object_ids = list(sky.dso_data)[:100]
+        output_file = os.path.join(paths.work_dir, "chart." + output_format)
+
+        def run():
+            plot = StarPlot(1280, 800, sky, object_ids)
+            if output_format == "pdf":
+                plot.write_pdf(output_file)
+            else:
+                plot.write_png(output_file)
+        return (run, len(sky.stars))
+    return stage
+
+
+STAGES: Dict[str, Stage] = {
+    "read_star_data": read_star_data_stage,
+    "load_star_cache": load_star_cache_stage,
+    "read_dso_data": read_dso_data_stage,
+    "read_milky_way": read_milky_way_stage,
+    "extract_counts": extract_counts_stage,
+    "validate_observations": validate_observations_stage,
+    "sort_objects": sort_objects_stage,
+    "write_pdf": chart_stage("pdf"),
+    "write_png": chart_stage("png"),
+}
+
+
+def measure(run: Callable[[], object], memory: bool, repeat: int = 3,
+            min_seconds: float = 0.5) -> Tuple[float, Optional[float]]:
+    """Returns the fastest wall time of run, called at least repeat times and
+    until the calls take min_seconds in all, and its peak traced memory in MB."""
+    seconds = None
+    total = 0.0
+    runs = 0
+    while runs < repeat or total < min_seconds:
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+        total += elapsed
+        runs += 1
+
+    peak_mb = None
+    if memory:
+        tracemalloc.start()
+        try:
+            run()
+            peak_mb = tracemalloc.get_traced_memory()[1] / 1e6
+        finally:
+            tracemalloc.stop()
+    return (seconds, peak_mb)
+
+
+def current_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=TOOLS_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def read_results(results_file: str) -> List[Result]:
+    results = []
+    try:
+        with open(results_file, 'r') as rfile:
+            for line in rfile:
+                if line.strip():
+                    results.append(Result(**json.loads(line)))
+    except OSError:
+        pass
+    return results
+
+
+def previous_result(results: List[Result], result: Result) -> Optional[Result]:
+    earlier = [r for r in results
+               if r.stage == result.stage and r.scale == result.scale and r.run < result.run]
+    return max(earlier, key=lambda r: r.run) if earlier else None
+
+
+def compare(result: Result, previous: Optional[Result], threshold: float,
+            min_difference: float) -> str:
+    if previous is None or previous.seconds <= 0:
+        return ""
+    change = result.seconds / previous.seconds - 1.0
+    slower = change > threshold and result.seconds - previous.seconds > min_difference
+    flag = "  REGRESSION" if slower else ""
+    return "{:+.0%} vs {}{}".format(change, previous.commit or previous.run, flag)
+
+
+def run_benchmarks(scales: List[int], stage_names: List[str], data_dir: str,
+                   results_file: str, memory: bool, threshold: float, min_difference: float,
+                   repeat: int, min_seconds: float) -> List[Result]:
+    history = read_results(results_file)
+    run = datetime.datetime.now().isoformat(timespec='seconds')
+    commit = current_commit()
+    results = []
+
+    print("{:22s} {:>6s} {:>10s} {:>9s} {:>12s} {:>9s}".format(
+        "stage", "scale", "rows", "seconds", "rows/s", "peak MB"))
+    for scale in scales:
+        scale_dir = os.path.join(data_dir, "x{}".format(scale))
+        generate(scale_dir, scale)
+        paths = Paths(os.path.join(scale_dir, "data", "objects.tsv"),
+                      os.path.join(scale_dir, "data", "observations.tsv"),
+                      os.path.join(scale_dir, "data", "programs.tsv"),
+                      os.path.join(scale_dir, "skyplot", "data"),
+                      scale_dir)
+        for name in stage_names:
+            try:
+                (fn, rows) = STAGES[name](paths)
+            except ImportError as e:
+                print("{:22s} {:>6d} skipped: {}".format(name, scale, e))
+                continue
+            (seconds, peak_mb) = measure(fn, memory, repeat, min_seconds)
+            result = Result(run, commit, name, scale, rows, seconds,
+                            rows / seconds if seconds > 0 else 0.0, peak_mb)
+            results.append(result)
+            print("{:22s} {:>6d} {:>10d} {:>9.3f} {:>12.0f} {:>9s}  {}".format(
+                name, scale, rows, seconds, result.rows_per_second,
+                "{:.1f}".format(peak_mb) if peak_mb is not None else "-",
+                compare(result, previous_result(history, result), threshold, min_difference)))
+
+    with open(results_file, 'a') as rfile:
+        for result in results:
+            rfile.write(json.dumps(asdict(result)) + '\n')
+    return results
+
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option("-s", "--scales", dest="scales", default="1,10",
+                      help="comma separated multiples of the real data size (e.g. 10,100,1000)")
+    parser.add_option("--stages", dest="stages", default=",".join(STAGES),
+                      help="comma separated stages to run, from: " + ", ".join(STAGES))
+    parser.add_option("--data_dir", dest="data_dir",
+                      default=os.path.join(tempfile.gettempdir(), "astrodb_benchmark"),
+                      help="directory to keep the generated data in", metavar="DIR")
+    parser.add_option("-r", "--results_file", dest="results_file",
+                      default="benchmark_results.jsonl",
+                      help="file the results are appended to", metavar="JSONL FILE")
+    parser.add_option("--no_memory", dest="memory", action="store_false", default=True,
+                      help="don't measure peak memory (saves a traced run of each stage)")
+    parser.add_option("--repeat", dest="repeat", type="int", default=3,
+                      help="number of times to run each stage, keeping the fastest")
+    parser.add_option("--min_time", dest="min_time", type="float", default=0.5,
+                      help="run each stage more times until the runs take this many seconds")
+    parser.add_option("--threshold", dest="threshold", type="float", default=0.2,
+                      help="slowdown (e.g. 0.2 for 20%) to flag as a regression")
+    parser.add_option("--min_difference", dest="min_difference", type="float", default=0.05,
+                      help="seconds a stage must slow down by, as well, to flag a regression")
+    (options, args) = parser.parse_args()
+
+    stage_names = [s for s in options.stages.split(',') if s]
+    unknown = [s for s in stage_names if s not in STAGES]
+    if unknown:
+        parser.error("unknown stages: " + ", ".join(unknown))
+    scales = [int(s) for s in options.scales.split(',') if s]
+    if options.repeat < 1:
+        parser.error("--repeat must be at least 1.")
+
+    run_benchmarks(scales, stage_names, options.data_dir, options.results_file,
+                   options.memory, options.threshold, options.min_difference,
+                   options.repeat, options.min_time)
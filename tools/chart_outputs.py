@@ -0,0 +1,110 @@
+r"""
+Writes one drawing to several files: PNGs at any scale, PDF and SVG.
+
+Outputs are given as FILE[:SCALE], with the format taken from the file's
+extension, e.g. "chart.png", "chart@2x.png:2", "chart.pdf" or "chart.svg".
+Several can be listed in one string, separated by commas.  SCALE multiplies
+the size of the output (in pixels for PNG, points for PDF and SVG).
+
+For several outputs the chart is drawn once, onto a cairo recording
+surface, and the recording is replayed onto each output's surface.  The
+recording keeps the drawing commands rather than pixels, so every output is
+as sharp as if it had been drawn directly.  A single output at its normal
+size is drawn directly.
+
+Example:
+    write_outputs(chart.draw, 600, 400, parse_output_specs("c.pdf,c.png,c@2x.png:2"))
+"""
+import os
+from typing import Callable, List, NamedTuple, Optional
+
+import cairo
+
+FORMATS = {".png": "png", ".pdf": "pdf", ".svg": "svg"}
+
+
+class OutputSpec(NamedTuple):
+    file: str
+    format: str
+    scale: float = 1.0
+
+
+# Draws a chart on a context.  kind is "raster" when drawing directly on an
+# image, or "vector" otherwise (a PDF or SVG, or a recording that may be
+# replayed at any scale).
+Draw = Callable[[cairo.Context, str], None]
+
+
+def format_for(output_file: str, default_format: Optional[str] = None) -> str:
+    ext = os.path.splitext(output_file)[1].lower()
+    if ext in FORMATS:
+        return FORMATS[ext]
+    if default_format is None:
+        raise ValueError("unsupported format: " + output_file)
+    return default_format
+
+
+def parse_output_spec(spec: str, default_format: Optional[str] = None) -> OutputSpec:
+    """Parses FILE[:SCALE]; files without a known extension get default_format."""
+    (output_file, sep, scale) = spec.rpartition(':')
+    try:
+        value = float(scale) if sep else None
+    except ValueError:
+        value = None
+    if value is None:
+        # no scale; a ':' may be part of the name
+        return OutputSpec(spec, format_for(spec, default_format))
+    if value <= 0:
+        raise ValueError("scale must be positive: " + spec)
+    return OutputSpec(output_file, format_for(output_file, default_format), value)
+
+
+def parse_output_specs(specs: str, default_format: Optional[str] = None) -> List[OutputSpec]:
+    return [parse_output_spec(s, default_format) for s in specs.split(',') if s]
+
+
+def new_surface(output: OutputSpec, width: int, height: int) -> cairo.Surface:
+    w = width * output.scale
+    h = height * output.scale
+    if output.format == "png":
+        return cairo.ImageSurface(cairo.FORMAT_ARGB32, int(round(w)), int(round(h)))
+    elif output.format == "pdf":
+        return cairo.PDFSurface(output.file, w, h)
+    elif output.format == "svg":
+        return cairo.SVGSurface(output.file, w, h)
+    raise ValueError("unsupported format: " + output.format)
+
+
+def close_surface(surface: cairo.Surface, output: OutputSpec) -> None:
+    if output.format == "png":
+        surface.write_to_png(output.file)
+    surface.finish()
+
+
+def record(draw: Draw, width: int, height: int) -> cairo.RecordingSurface:
+    surface = cairo.RecordingSurface(cairo.CONTENT_COLOR_ALPHA,
+                                     cairo.Rectangle(0, 0, width, height))
+    draw(cairo.Context(surface), "vector")
+    return surface
+
+
+def replay(recording: cairo.RecordingSurface, width: int, height: int, output: OutputSpec) -> None:
+    surface = new_surface(output, width, height)
+    ctx = cairo.Context(surface)
+    ctx.scale(output.scale, output.scale)
+    ctx.set_source_surface(recording, 0, 0)
+    ctx.paint()
+    close_surface(surface, output)
+
+
+def write_outputs(draw: Draw, width: int, height: int, outputs: List[OutputSpec]) -> None:
+    """Draws a width x height chart to each of the outputs."""
+    if len(outputs) == 1 and outputs[0].scale == 1.0:
+        output = outputs[0]
+        surface = new_surface(output, width, height)
+        draw(cairo.Context(surface), "raster" if output.format == "png" else "vector")
+        close_surface(surface, output)
+        return
+    recording = record(draw, width, height)
+    for output in outputs:
+        replay(recording, width, height, output)
@@ -0,0 +1,111 @@
+r"""
+Checks references between objects.tsv, observations.tsv and programs.tsv.
+
+Reports duplicate ids, observations of objects that are not in the object
+table, and program entries whose object or observation does not exist (or
+whose observation does not list the object).  Each table is read once into
+hash indexes, so the check is linear in the size of the data.
+
+Usage:
+python3 check_references.py \
+        -j ../data/objects.tsv \
+        -d ../data/observations.tsv \
+        -p ../data/programs.tsv
+"""
+from collections import Counter
+from dataclasses import dataclass
+from dataclasses import field
+from optparse import OptionParser
+from typing import Dict, List, Set, Tuple
+
+from tsv_tables import parse_obj_ids
+from tsv_tables import read_objects
+from tsv_tables import read_observations
+from tsv_tables import read_programs
+
+
+@dataclass
+class Indexes:
+    """Ids of each table, and the objects listed by each observation."""
+    object_ids: Set[str] = field(default_factory=set)
+    duplicate_object_ids: List[str] = field(default_factory=list)
+    observation_objects: Dict[str, List[str]] = field(default_factory=dict)
+    duplicate_observation_ids: List[str] = field(default_factory=list)
+
+
+def build_indexes(obj_file: str, obs_file: str) -> Indexes:
+    indexes = Indexes()
+    for row in read_objects(obj_file):
+        if row.obj_id in indexes.object_ids:
+            indexes.duplicate_object_ids.append(row.obj_id)
+        indexes.object_ids.add(row.obj_id)
+    for row in read_observations(obs_file):
+        if row.obs_id in indexes.observation_objects:
+            indexes.duplicate_observation_ids.append(row.obs_id)
+        indexes.observation_objects[row.obs_id] = parse_obj_ids(row.obj_ids)
+    return indexes
+
+
+def check_references(obj_file: str, obs_file: str, program_file: str) -> int:
+    """Prints each broken reference.  Returns the number of problems found."""
+    indexes = build_indexes(obj_file, obs_file)
+    errors: List[str] = []
+
+    for obj_id in indexes.duplicate_object_ids:
+        errors.append("duplicate object id: {}".format(obj_id))
+    for obs_id in indexes.duplicate_observation_ids:
+        errors.append("duplicate observation id: {}".format(obs_id))
+
+    for obs_id, obj_ids in indexes.observation_objects.items():
+        for obj_id in obj_ids:
+            if obj_id not in indexes.object_ids:
+                errors.append("error for item: {}: object {} is not in the object file".format(
+                    obs_id, obj_id))
+
+    item_numbers: Counter[Tuple[str, str]] = Counter()
+    for entry in read_programs(program_file):
+        item = "{} #{} ({})".format(entry.program, entry.number, entry.obj_id)
+        item_numbers[(entry.program, entry.number)] += 1
+        if entry.obj_id not in indexes.object_ids:
+            errors.append("error for program item: {}: object is not in the object file".format(item))
+        if not entry.observation_id:
+            continue
+        if entry.observation_id not in indexes.observation_objects:
+            errors.append("error for program item: {}: observation {} does not exist".format(
+                item, entry.observation_id))
+        elif entry.obj_id not in indexes.observation_objects[entry.observation_id]:
+            errors.append("error for program item: {}: observation {} does not list the object".format(
+                item, entry.observation_id))
+
+    for (program, number), count in item_numbers.items():
+        if count > 1:
+            errors.append("duplicate program item: {} #{} appears {} times".format(program, number, count))
+
+    for e in errors:
+        print(e)
+    return len(errors)
+
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option("-j", "--object_file",
+                      dest="object_file",
+                      help="file with objects",
+                      metavar="TSV FILE")
+    parser.add_option("-d", "--observation_file",
+                      dest="observation_file",
+                      help="file with observations",
+                      metavar="TSV FILE")
+    parser.add_option("-p", "--program_file",
+                      dest="program_file",
+                      help="file with programs",
+                      metavar="TSV FILE")
+    (options, args) = parser.parse_args()
+    if not (options.object_file and
+            options.observation_file and
+            options.program_file):
+        parser.error("all options must be set.  Run with -h to see usage.")
+
+    check_references(options.object_file,
+                     options.observation_file,
+                     options.program_file)
@@ -0,0 +1,137 @@
+r"""
+Incremental reading of tables that are only appended to.
+
+fold_table computes something from every row of a table, and saves it in a
+checkpoint file along with how many bytes of the table were read and a hash
+of those bytes.  The next time, if the table still starts with exactly
+those bytes, only the rows after them are read and added to the saved
+result.  If anything before that point changed (a row was edited, deleted
+or reordered), the result is computed again from the start.
+
+Example:
+    def add(counts, row):
+        counts[row.date] = counts.get(row.date, 0) + 1
+    counts = fold_table("../data/observations.tsv", OBSERVATIONS,
+                        "obs_by_date.checkpoint", "obs_by_date/1",
+                        lambda saved: saved or {}, add, lambda counts: counts)
+"""
+import hashlib
+import itertools
+import json
+import os
+from dataclasses import asdict
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator, Optional, TypeVar
+
+from tsv_tables import Table
+from tsv_tables import read_table_lines
+
+# Bump when the checkpoint layout changes.
+CHECKPOINT_VERSION = 1
+
+Result = TypeVar("Result")
+
+
+@dataclass
+class Checkpoint:
+    """How far a table was read, and what was computed from it.
+
+    key names what was computed (and its version), so a checkpoint file
+    is never mistaken for another computation's.  header is the table's
+    header line, needed to parse the rows after offset.
+    """
+    version: int
+    key: str
+    offset: int
+    prefix_sha1: str
+    header: Optional[str]
+    state: Any
+
+
+def read_checkpoint(checkpoint_file: str) -> Optional[Checkpoint]:
+    try:
+        with open(checkpoint_file, 'r') as cfile:
+            return Checkpoint(**json.load(cfile))
+    except (OSError, ValueError, TypeError):
+        return None
+
+
+def write_checkpoint(checkpoint_file: str, checkpoint: Checkpoint) -> None:
+    tmp_file = checkpoint_file + ".tmp"
+    with open(tmp_file, 'w') as cfile:
+        json.dump(asdict(checkpoint), cfile)
+    os.replace(tmp_file, checkpoint_file)
+
+
+def matches_prefix(f, checkpoint: Checkpoint, sha1) -> bool:
+    """Hashes the first checkpoint.offset bytes of f into sha1, and checks
+    that they are the bytes the checkpoint was made from."""
+    remaining = checkpoint.offset
+    while remaining > 0:
+        chunk = f.read(min(remaining, 1 << 20))
+        if not chunk:
+            return False
+        sha1.update(chunk)
+        remaining -= len(chunk)
+    return sha1.hexdigest() == checkpoint.prefix_sha1
+
+
+def fold_table(table_file: str, table: Table, checkpoint_file: str, key: str,
+               load: Callable[[Optional[Any]], Result],
+               add: Callable[[Result, Any], None],
+               save: Callable[[Result], Any]) -> Result:
+    """Adds every row of the table to a result, reading only new rows if possible.
+
+    load makes the result from the saved state (or None, to start empty),
+    add adds a row to it and save changes it to something json can store.
+    """
+    checkpoint = read_checkpoint(checkpoint_file)
+    with open(table_file, 'rb') as f:
+        sha1 = hashlib.sha1()
+        resumed = (checkpoint is not None and
+                   checkpoint.version == CHECKPOINT_VERSION and
+                   checkpoint.key == key and
+                   matches_prefix(f, checkpoint, sha1))
+        if resumed:
+            result = load(checkpoint.state)
+            offset = checkpoint.offset
+            header = checkpoint.header
+        else:
+            f.seek(0)
+            sha1 = hashlib.sha1()
+            result = load(None)
+            offset = 0
+            header = None
+
+        # the last line may still be being written; only checkpoint whole lines
+        partial_line = None
+
+        def whole_lines() -> Iterator[str]:
+            nonlocal offset, header, partial_line
+            for raw_line in f:
+                if not raw_line.endswith(b'\n'):
+                    try:
+                        partial_line = raw_line.decode('utf-8')
+                    except UnicodeDecodeError:
+                        # cut off in the middle of a character; it is read
+                        # once it is written in full
+                        pass
+                    return
+                line = raw_line.decode('utf-8')
+                if header is None and line.startswith('#'):
+                    header = line
+                sha1.update(raw_line)
+                offset += len(raw_line)
+                yield line
+
+        # when resuming, the header was read with the checkpointed rows
+        lines = itertools.chain([header] if resumed and header else [], whole_lines())
+        for row in read_table_lines(lines, table):
+            add(result, row)
+
+    write_checkpoint(checkpoint_file, Checkpoint(CHECKPOINT_VERSION, key, offset,
+                                                 sha1.hexdigest(), header, save(result)))
+    if partial_line is not None:
+        for row in read_table_lines(([header] if header else []) + [partial_line], table):
+            add(result, row)
+    return result
@@ -1,48 +1,83 @@
 r"""
 Generates graphs for observations and sessions by month.
 
+With -b, also writes a bar chart of observations for each of the other
+breakdowns (scope, location, seeing, ...).  All counts are gathered in a
+single pass over the observation file.
+
 Example:
 python3 gen_frequency_charts.py \
     -d ../data/observations.tsv \
     -o num_observations_by_month.png \
-    -s num_sessions_by_month.png
+    -s num_sessions_by_month.png \
+    -j ../data/objects.tsv \
+    -b breakdowns
+
+Add -c counts.checkpoint to keep the counts between runs, so that only
+observations added since the last run are read.
+
+-o and -s may each list several outputs, e.g. a PNG at twice the size and
+a PDF, as -o obs.png,obs@2x.png:2,obs.pdf (see chart_outputs.py); the
+chart is drawn once for all of them.
+
+cairo is only imported when a chart is drawn.
 """
-from collections import defaultdict
 from dataclasses import dataclass
 from optparse import OptionParser
-from typing import List, Tuple, Counter, DefaultDict
-import cairo
-import re
+from typing import Dict, Hashable, List, Optional, Tuple, Counter
+import os
+
+from aggregate import aggregate
+from aggregate import Aggregator
+from aggregate import by_object_type
+from aggregate import Dimension
+from aggregate import BY_HOUR
+from aggregate import BY_LOCATION
+from aggregate import BY_MONTH
+from aggregate import BY_SCOPE
+from aggregate import BY_SEEING
+from aggregate import BY_TRANSPARENCY
+from aggregate import BY_WEEKDAY
+from aggregate import SESSIONS_BY_MONTH
+from checkpoint import fold_table
+from tsv_tables import OBSERVATIONS
+from tsv_tables import read_observations
 
 YearMonth = Tuple[int, int]
 YearMonthCount = Tuple[int, int, int]
 CountList = List[YearMonthCount]
 ObservationsAndSessionsByMonth = Tuple[CountList, CountList]
 
+# Bump if what the dimensions count changes, so checkpointed counts are redone.
+COUNTS_VERSION = 1
+
+
+def to_count_list(counts: Counter[YearMonth]) -> CountList:
+    return [(year, month, counts[(year, month)]) for (year, month) in sorted(counts)]
 
-def extract_counts(obs_file: str) -> ObservationsAndSessionsByMonth:
-    """Extract num of observations and num of sessions by month."""
-    ofile = open(obs_file, 'r')
-    lines = ofile.readlines()
-    num_observations: Counter[YearMonth] = Counter()
-    sessions: DefaultDict[YearMonth, set] = defaultdict(set)
-    for line in lines:
-        date_match = re.search(r"\t(\d\d\d\d)-(\d\d)-(\d\d)\t", line)
-        if date_match:
-            year = int(date_match.group(1))
-            month = int(date_match.group(2))
-            day = int(date_match.group(3))
 
-            num_observations[(year, month)] += 1
-            sessions[(year, month)].add(day)
+def count_observations(obs_file: str, dimensions: List[Dimension],
+                       checkpoint_file: Optional[str] = None) -> Dict[str, Counter[Hashable]]:
+    """Counts the observations along each dimension, in one pass.
 
-    num_observations_by_month = []
-    num_sessions_by_month = []
-    for k in num_observations:
-        num_observations_by_month.append((k[0], k[1], num_observations[k]))
-        num_sessions_by_month.append((k[0], k[1], len(sessions[k])))
+    With a checkpoint file, the counts are saved there and later runs only
+    read the observations added since (unless earlier ones were changed).
+    """
+    if not checkpoint_file:
+        return aggregate(read_observations(obs_file), dimensions)
+    key = "{}:{}".format(COUNTS_VERSION, [(d.name, d.data_version) for d in dimensions])
+    aggregator = fold_table(obs_file, OBSERVATIONS, checkpoint_file, key,
+                            lambda saved: Aggregator.from_json(dimensions, saved) if saved is not None
+                            else Aggregator(dimensions),
+                            Aggregator.add, Aggregator.to_json)
+    return {d.name: aggregator.counts(d.name) for d in dimensions}
 
-    return (num_observations_by_month, num_sessions_by_month)
+
+def extract_counts(obs_file: str, checkpoint_file: Optional[str] = None) -> ObservationsAndSessionsByMonth:
+    """Extract num of observations and num of sessions by month."""
+    counts = count_observations(obs_file, [BY_MONTH, SESSIONS_BY_MONTH], checkpoint_file)
+    return (to_count_list(counts[BY_MONTH.name]),
+            to_count_list(counts[SESSIONS_BY_MONTH.name]))
 
 
 @dataclass
@@ -94,6 +129,7 @@ class SquareChart:
         return self.square_left + (month - min_month) * self.square_size
 
     def __set_default_font(self, ctx) -> None:
+        import cairo
         ctx.select_font_face(self.font_face,
                              cairo.FONT_SLANT_NORMAL,
                              cairo.FONT_WEIGHT_NORMAL)
@@ -163,6 +199,7 @@ class SquareChart:
             ctx.fill()
 
     def __compute_height(self) -> int:
+        import cairo
         # note: if the draw_month_axis function changes, so must this.
         surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, 100, 100)
         ctx = cairo.Context(surface)
@@ -181,12 +218,7 @@ class SquareChart:
             ctx.text_path(str(year))
             ctx.fill()
 
-    def create_plot(self, output_file) -> None:
-        """Create a plot and saves it to output_file."""
-        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32,
-                                     self.width, self.height)
-        ctx = cairo.Context(surface)
-
+    def draw(self, ctx, kind: str = "raster") -> None:
         # fill background
         ctx.set_source_rgb(1.0, 1.0, 1.0)
         ctx.paint()
@@ -196,11 +228,107 @@ class SquareChart:
         self.__draw_month_axis(ctx)
         self.__draw_year_axis(ctx)
 
-        surface.write_to_png(output_file)
+    def create_plot(self, output_file) -> None:
+        """Create a plot and saves it to output_file, which may list several
+        outputs of any format, as FILE[:SCALE],... (see chart_outputs.py)."""
+        from chart_outputs import parse_output_specs
+        from chart_outputs import write_outputs
+        write_outputs(self.draw, self.width, self.height, parse_output_specs(output_file, "png"))
+
+
+class BarChart:
+    """Create horizontal bar charts to visualize counts by category."""
+
+    def __init__(self, counts: Counter[Hashable], dimension: Dimension,
+                 title: str, width: int = 500):
+        if dimension.by_count:
+            keys = sorted(counts, key=lambda k: (-counts[k], str(k)))
+        else:
+            keys = sorted(counts)
+        self.bars = [(dimension.label(k), counts[k]) for k in keys]
+        self.width = width
+        self.title = title
 
+        # play with these to change the look of the chart
+        self.margin = 10
+        self.bar_space = 4
+        self.bar_height = 20
+        self.bar_top = 45
+        self.label_width = 150
+        self.bar_color = Color(0.0, 0.4, 0.8)
+        self.font_face = "sans-serif"
 
-if __name__ == "__main__":
-    parser = OptionParser()
+        # computed internal variables
+        self.bar_left = self.margin + self.label_width
+        self.count_width = 50
+        self.max_bar_width = self.width - self.bar_left - self.count_width - self.margin
+        self.height = int(self.bar_top + len(self.bars) * self.bar_height + self.margin)
+        self.max_count = max([c for _, c in self.bars])
+
+    def __set_font(self, ctx, size: int) -> None:
+        import cairo
+        ctx.select_font_face(self.font_face,
+                             cairo.FONT_SLANT_NORMAL,
+                             cairo.FONT_WEIGHT_NORMAL)
+        ctx.set_font_size(size)
+
+    def __draw_title(self, ctx) -> None:
+        self.__set_font(ctx, 16)
+        (_, _, width, height, _, _) = ctx.text_extents(self.title)
+        ctx.set_source_rgb(0, 0, 0)
+        ctx.move_to(0.5 * (self.width - width), self.margin + height)
+        ctx.text_path(self.title)
+        ctx.fill()
+
+    def __draw_bars(self, ctx) -> None:
+        self.__set_font(ctx, 12)
+        for i, (label, cnt) in enumerate(self.bars):
+            top = self.bar_top + i * self.bar_height
+            bar_width = self.max_bar_width * cnt / self.max_count
+
+            ctx.set_source_rgb(self.bar_color.r, self.bar_color.g, self.bar_color.b)
+            ctx.rectangle(self.bar_left, top + self.bar_space / 2,
+                          bar_width, self.bar_height - self.bar_space)
+            ctx.fill()
+
+            ctx.set_source_rgb(0, 0, 0)
+            (_, _, width, height, _, _) = ctx.text_extents(label)
+            y_center = top + 0.5 * (self.bar_height + height)
+            ctx.move_to(self.bar_left - self.margin - width, y_center)
+            ctx.text_path(label)
+            ctx.fill()
+
+            ctx.move_to(self.bar_left + bar_width + self.margin / 2, y_center)
+            ctx.text_path(str(cnt))
+            ctx.fill()
+
+    def draw(self, ctx, kind: str = "raster") -> None:
+        # fill background
+        ctx.set_source_rgb(1.0, 1.0, 1.0)
+        ctx.paint()
+
+        self.__draw_title(ctx)
+        self.__draw_bars(ctx)
+
+    def create_plot(self, output_file) -> None:
+        """Create a plot and saves it to output_file, which may list several
+        outputs, as for SquareChart."""
+        from chart_outputs import parse_output_specs
+        from chart_outputs import write_outputs
+        write_outputs(self.draw, self.width, self.height, parse_output_specs(output_file, "png"))
+
+
+def breakdown_dimensions(obj_file: Optional[str] = None) -> List[Dimension]:
+    """Dimensions drawn as bar charts; object type needs the object file."""
+    dimensions = [BY_SCOPE, BY_LOCATION, BY_SEEING, BY_TRANSPARENCY, BY_WEEKDAY, BY_HOUR]
+    if obj_file:
+        dimensions.append(by_object_type(obj_file))
+    return dimensions
+
+
+def parse_options(argv: Optional[List[str]] = None, prog: Optional[str] = None):
+    """Parses (and checks) the command line options."""
+    parser = OptionParser(prog=prog)
     parser.add_option("-d", "--observation_file",
                       dest="observation_file",
                       help="file with observations",
@@ -208,19 +336,59 @@ if __name__ == "__main__":
     parser.add_option("-o", "--observations_chart",
                       dest="observations_chart",
                       help="file name of observations chart to create.",
-                      metavar="PNG FILE")
+                      metavar="FILE[:SCALE],...")
     parser.add_option("-s", "--sessions_chart",
                       dest="sessions_chart",
                       help="file name of sessions chart to create.",
-                      metavar="PNG FILE")
-    (options, args) = parser.parse_args()
+                      metavar="FILE[:SCALE],...")
+    parser.add_option("-c", "--checkpoint_file",
+                      dest="checkpoint_file",
+                      help="file keeping the monthly counts, so only new observations are read (optional)",
+                      metavar="FILE")
+    parser.add_option("-j", "--object_file",
+                      dest="object_file",
+                      help="file with objects, for the object type breakdown (optional)",
+                      metavar="TSV FILE")
+    parser.add_option("-b", "--breakdown_dir",
+                      dest="breakdown_dir",
+                      help="directory for bar charts of other breakdowns (optional)",
+                      metavar="DIR")
+    (options, args) = parser.parse_args(argv)
     if not (options.observation_file and
             options.observations_chart and
             options.sessions_chart):
-        parser.error("all options must be set.  Run with -h to see usage.")
-
-    (num_observations_by_month, num_sessions_by_month) = extract_counts(
-            options.observation_file)
+        parser.error("options -d, -o and -s must be set.  Run with -h to see usage.")
+    return options
+
+
+def main(options, data=None) -> None:
+    """Draws the charts.  data, a WarmData (see watch.py), keeps the counts
+    for later commands in the same run."""
+    def count():
+        breakdowns = breakdown_dimensions(options.object_file) if options.breakdown_dir else []
+        return (breakdowns,
+                count_observations(options.observation_file,
+                                   [BY_MONTH, SESSIONS_BY_MONTH] + breakdowns,
+                                   options.checkpoint_file))
+
+    if data is not None:
+        files = [options.observation_file] + ([options.object_file] if options.object_file else [])
+        name = "frequency counts" + (" with breakdowns" if options.breakdown_dir else "")
+        (breakdowns, counts) = data.get(files, count, name)
+    else:
+        (breakdowns, counts) = count()
+    num_observations_by_month = to_count_list(counts[BY_MONTH.name])
+    num_sessions_by_month = to_count_list(counts[SESSIONS_BY_MONTH.name])
+
+    if breakdowns:
+        os.makedirs(options.breakdown_dir, exist_ok=True)
+    for dimension in breakdowns:
+        if not counts[dimension.name]:
+            continue
+        chart = BarChart(counts[dimension.name], dimension,
+                         "Observations by " + dimension.name, width=600)
+        chart.create_plot(os.path.join(options.breakdown_dir,
+                                       dimension.name.replace(' ', '_') + ".png"))
 
     obs_chart = SquareChart(num_observations_by_month,
                             "Number of Observations",
@@ -231,3 +399,7 @@ if __name__ == "__main__":
                             "Number of Observing Sessions",
                             width=600)
     ses_chart.create_plot(options.sessions_chart)
+
+
+if __name__ == "__main__":
+    main(parse_options())
@@ -5,66 +5,79 @@ python3 progress.py \
         -p ../data/programs.tsv \
         -n "Messier OP" \
         -o messier.pdf
+
+To graph every program in one run, with one page per program:
+python3 progress.py \
+        -p ../data/programs.tsv \
+        -a \
+        -o programs.pdf
+or, with -o naming a directory, one png per program in that directory.
+
+Add -c dates.checkpoint to keep the dates seen between runs, so that only
+entries added to the end of the program file since then are read.
+
+matplotlib is only imported when a graph is drawn.
 """
 
-import datetime
-import matplotlib
-import matplotlib.dates as mdates
-from matplotlib.dates import DateFormatter
-import matplotlib.pyplot as plt
+import os
+import re
+import numpy as np
 from optparse import OptionParser
 
+from checkpoint import fold_table
+from tsv_tables import PROGRAMS
+from tsv_tables import read_programs
+
+# Names the dates kept in checkpoint files; bump if what is kept changes.
+DATES_SEEN_KEY = "dates_seen/1"
+
 
 def parse_date(observation_id):
     'Parses an id like 20190129-02-m81m82 to a date, e.g., 2019-01-29.'
     return observation_id[0:4] + "-" + observation_id[4:6] + "-" + observation_id[6:8]
 
 
-def get_dates_seen(program_file, program_name):
+def add_entry(program_to_dates, entry):
+    if entry.program not in program_to_dates:
+        program_to_dates[entry.program] = {}
+    # only count entries that have an observation
+    if entry.observation_id:
+        date_to_count = program_to_dates[entry.program]
+        obs_date = parse_date(entry.observation_id)
+        if obs_date not in date_to_count:
+            date_to_count[obs_date] = 0
+        date_to_count[obs_date] += 1
+
+
+def get_dates_seen_by_program(program_file, checkpoint_file=None):
+    """Creates a map of program -> date -> num observations, in one pass.
+    With a checkpoint file, only entries added since the last run are read."""
+    if checkpoint_file:
+        return fold_table(program_file, PROGRAMS, checkpoint_file, DATES_SEEN_KEY,
+                          lambda saved: saved if saved is not None else {},
+                          add_entry, lambda program_to_dates: program_to_dates)
+    program_to_dates = {}
+    for entry in read_programs(program_file):
+        add_entry(program_to_dates, entry)
+    return program_to_dates
+
+
+def get_dates_seen(program_file, program_name, checkpoint_file=None):
     'Creates a map of date -> num observations for the given program.'
-    pfile = open(program_file, 'r')
-    lines = pfile.readlines()
-    seen_set = set({})
-    date_to_count = {}
-    for line in lines:
-        fields = line.strip().split('\t')
-        program = fields[0]
-        object_name = fields[2]
-        # check if this line corresponds to the program of interest and
-        # has an observation
-        if program == program_name and len(fields) == 4:
-            observation_id = fields[3]
-            obs_date = parse_date(observation_id)
-            if obs_date not in date_to_count:
-                date_to_count[obs_date] = 0
-            date_to_count[obs_date] += 1
-    return date_to_count
-
-
-def fill_missing_dates(date_to_count):
-    # compute first, last dates
-    sorted_date_counts = sorted(date_to_count)
-    start = datetime.datetime.strptime(sorted_date_counts[0], "%Y-%m-%d")
-    end = datetime.datetime.strptime(sorted_date_counts[-1], "%Y-%m-%d")
-    dates = [start + datetime.timedelta(days=x)
-             for x in range(0, (end-start).days + 1)]
-
-    curr_count = 0
-    str_dates = []
-    counts = []
-    for date in dates:
-        str_date = date.strftime("%Y-%m-%d")
-        if str_date in date_to_count:
-            curr_count += date_to_count[str_date]
-        str_dates.append(str_date)
-        counts.append(curr_count)
-    return (str_dates, counts)
+    return get_dates_seen_by_program(program_file, checkpoint_file).get(program_name, {})
 
 
-def save_plot(dates, counts, program_name, output_file):
-    x_values = [datetime.datetime.strptime(
-        d, "%Y-%m-%d").date() for d in dates]
-    ax = plt.gca()
+def cumulative_counts(date_to_count):
+    """Changes a map of date -> count to arrays of the distinct dates, in
+    order, and the total count up to and including each date."""
+    dates = np.array(list(date_to_count.keys()), dtype='datetime64[D]')
+    counts = np.array(list(date_to_count.values()), dtype=np.int64)
+    order = np.argsort(dates)
+    return (dates[order], np.cumsum(counts[order]))
+
+
+def plot_progress(ax, dates, counts, program_name):
+    import matplotlib.dates as mdates
 
     years = mdates.YearLocator()   # every year
     months = mdates.MonthLocator()  # every month
@@ -76,25 +89,93 @@ def save_plot(dates, counts, program_name, output_file):
 
     ax.grid(True)
 
-    plt.plot(x_values, counts)
-    plt.title(program_name)
-    plt.savefig(output_file)
+    # the count only changes on the dates given, so draw it as steps
+    ax.step(dates, counts, where='post')
+    ax.set_title(program_name)
 
 
-if __name__ == "__main__":
-    parser = OptionParser()
+def save_plot(dates, counts, program_name, output_file):
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots()
+    plot_progress(ax, dates, counts, program_name)
+    fig.savefig(output_file)
+    plt.close(fig)
+
+
+def file_name_for(program_name):
+    'Changes a program name like "Wimmer\'s List" to wimmers_list.'
+    name = re.sub(r"[^a-z0-9 ]", "", program_name.lower())
+    return re.sub(r" +", "_", name.strip())
+
+
+def save_all_plots(program_file, output, checkpoint_file=None):
+    'Graphs every program with observations, reading the programs once.'
+    save_programs(get_dates_seen_by_program(program_file, checkpoint_file), output)
+
+
+def save_programs(program_to_dates, output):
+    'Graphs every program with observations, given their dates seen.'
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    programs = [p for p in program_to_dates if program_to_dates[p]]
+    if os.path.isdir(output):
+        for program_name in programs:
+            (dates, counts) = cumulative_counts(program_to_dates[program_name])
+            save_plot(dates, counts, program_name,
+                      os.path.join(output, file_name_for(program_name) + ".png"))
+    else:
+        with PdfPages(output) as pdf:
+            for program_name in programs:
+                (dates, counts) = cumulative_counts(program_to_dates[program_name])
+                fig, ax = plt.subplots()
+                plot_progress(ax, dates, counts, program_name)
+                pdf.savefig(fig)
+                plt.close(fig)
+
+
+def parse_options(argv=None, prog=None):
+    """Parses (and checks) the command line options."""
+    parser = OptionParser(prog=prog)
     parser.add_option("-p", "--program_file", dest="program_file",
                       help="file with programs", metavar="FILE")
     parser.add_option("-n", "--program_name", dest="program_name",
                       help="program name to graph")
+    parser.add_option("-a", "--all_programs", dest="all_programs",
+                      action="store_true", default=False,
+                      help="graph all programs (to a multi-page pdf or a directory)")
     parser.add_option("-o", "--output_file", dest="output_file",
                       help="graphics file to create", metavar="FILE")
-    (options, args) = parser.parse_args()
+    parser.add_option("-c", "--checkpoint_file", dest="checkpoint_file",
+                      help="file keeping the dates seen, so only new entries are read",
+                      metavar="FILE")
+    (options, args) = parser.parse_args(argv)
     if not (options.program_file and
-            options.program_name and
+            (options.program_name or options.all_programs) and
             options.output_file):
         parser.error("all options must be set.  Run with -h to see usage.")
+    return options
+
+
+def main(options, data=None):
+    """Draws the graphs.  data, a WarmData (see watch.py), keeps the dates
+    seen for later commands in the same run."""
+    if data is not None:
+        program_to_dates = data.get([options.program_file],
+                                    lambda: get_dates_seen_by_program(options.program_file,
+                                                                      options.checkpoint_file),
+                                    "program dates")
+    else:
+        program_to_dates = get_dates_seen_by_program(options.program_file,
+                                                     options.checkpoint_file)
+    if options.all_programs:
+        save_programs(program_to_dates, options.output_file)
+    else:
+        dc = program_to_dates.get(options.program_name, {})
+        (dates, counts) = cumulative_counts(dc)
+        save_plot(dates, counts, options.program_name, options.output_file)
+
 
-    dc = get_dates_seen(options.program_file, options.program_name)
-    (dates, counts) = fill_missing_dates(dc)
-    save_plot(dates, counts, options.program_name, options.output_file)
+if __name__ == "__main__":
+    main(parse_options())
@@ -3,31 +3,190 @@ Plots objects on a star chart.
 
 Usage:
 python3 chart_generator.py -i data/H400.tsv -o H400.pdf
+
+The output's format is taken from its extension (pdf, png or svg).  Several
+outputs may be given, separated by commas, each as FILE[:SCALE]; the chart
+is drawn once and the drawing is copied to each, e.g. for a PDF to print and
+a PNG at twice the size for the screen:
+python3 chart_generator.py -i data/H400.tsv -o H400.pdf,H400.png:2
+
+For a finder chart of a region, give its center and field of view, e.g.,
+a 5 degree field around M 31 showing stars to magnitude 8:
+python3 chart_generator.py -i data/H400.tsv -o m31.pdf \
+        --ra 0.712 --dec 41.27 --fov 5 --mag_limit 8
+
+To draw many charts in one run, so the catalogs are only read once, list
+them in a tab-separated manifest (see read_manifest) and run:
+python3 chart_generator.py -b charts.tsv
+The star field, milky way, grid and constellation lines are drawn once for
+each chart size and region and reused, so only the objects are drawn per
+chart; --cache_dir keeps the PNG backgrounds between runs as well.  A batch
+run ends by printing how many catalog rows were read, and which were
+skipped and why; with --strict, a malformed row stops the run instead.
+
+To see where the time goes, --profile writes a JSON report of how long each
+catalog took to load and, for each chart, how long each layer took to draw
+and how many arcs, path vertices, fills, etc. it drew:
+python3 chart_generator.py -b charts.tsv --profile report.json
 """
 
-from constellation_lines import read_constellation_lines
-from dso import read_dso_data
+import os
+from contextlib import nullcontext
+from dataclasses import dataclass
+from optparse import OptionParser
+from typing import List
+from typing import Optional
+
 from dso import read_object_list
-from milkyway import read_milky_way
-from star import read_star_data
+from dso_glyphs import GlyphCache
+from loader_metrics import LoadMetrics
+from render_profile import RenderProfile
+from sky_data import SkyData
+from sky_data import load_sky_data
+from star_chart import BackgroundCache
+from star_chart import Region
 from star_chart import StarPlot
-from optparse import OptionParser
 
-if __name__ == "__main__":
-    parser = OptionParser()
+# (star_chart puts the tools directory, with the output writers, on the path)
+from chart_outputs import OutputSpec
+from chart_outputs import parse_output_specs
+
+
+@dataclass
+class ChartJob:
+    object_ids: str
+    # one or more FILE[:SCALE], separated by commas
+    output_file: str
+    width: int = 1280
+    height: int = 800
+    # format of a single output, if not the one its extension gives
+    output_format: str = ""
+    region: Optional[Region] = None
+
+    def outputs(self) -> List[OutputSpec]:
+        outputs = parse_output_specs(self.output_file, "pdf")
+        if len(outputs) == 1 and self.output_format:
+            outputs = [outputs[0]._replace(format=self.output_format)]
+        return outputs
+
+
+def read_manifest(manifest_file: str) -> List[ChartJob]:
+    """Reads a list of charts to draw.
+
+    Each line has the tab-separated fields
+        objectList  output  [width  height  format  [ra  dec  fov  magLimit]]
+    where empty fields take their defaults, format is pdf, png or svg (by
+    default taken from the output extension), and the last four describe a
+    regional chart.  output may list several outputs, as for -o.  Relative
+    paths are relative to the manifest.  Lines starting with '#' are
+    comments.
+    """
+    base_dir = os.path.dirname(os.path.abspath(manifest_file))
+    jobs = []
+    with open(manifest_file, 'r') as mfile:
+        for line in mfile:
+            if line.startswith('#') or not line.strip():
+                continue
+            fields = line.rstrip('\r\n').split('\t') + [''] * 9
+            outputs = [os.path.join(base_dir, f) for f in fields[1].split(',') if f]
+            job = ChartJob(os.path.join(base_dir, fields[0]), ','.join(outputs))
+            if fields[2]:
+                job.width = int(fields[2])
+            if fields[3]:
+                job.height = int(fields[3])
+            job.output_format = fields[4]
+            if fields[7]:
+                mag_limit = float(fields[8]) if fields[8] else 6.5
+                job.region = Region(float(fields[5]), float(fields[6]), float(fields[7]), mag_limit)
+            jobs.append(job)
+    return jobs
+
+
+def render(job: ChartJob, sky: SkyData, background: Optional[BackgroundCache] = None,
+           glyphs: Optional[GlyphCache] = None, profile: Optional[RenderProfile] = None) -> None:
+    if profile is not None:
+        chart = profile.chart(job.output_file, job.width, job.height)
+    else:
+        chart = nullcontext()
+    with chart:
+        objects = read_object_list(job.object_ids)
+        plot = StarPlot(job.width, job.height, sky, objects, job.region, background, glyphs, profile)
+        plot.write_outputs(job.outputs())
+
+
+def parse_options(argv: Optional[List[str]] = None, prog: Optional[str] = None):
+    """Parses (and checks) the command line options."""
+    parser = OptionParser(prog=prog)
     parser.add_option("-i", "--object_ids", dest="object_ids",
                       help="list of object ids to plot", metavar="FILE")
     parser.add_option("-o", "--output_map", dest="output_map",
-                      help="output pdf map file to create")
-    (options, args) = parser.parse_args()
-    if not (options.object_ids and options.output_map):
+                      help="map file(s) to create, as FILE[:SCALE],...")
+    parser.add_option("-b", "--batch", dest="batch",
+                      help="manifest of charts to create", metavar="TSV FILE")
+    parser.add_option("--cache_dir", dest="cache_dir",
+                      help="directory to keep chart backgrounds in between runs",
+                      metavar="DIR")
+    parser.add_option("--width", dest="width", type="int", default=1280,
+                      help="width of the chart")
+    parser.add_option("--height", dest="height", type="int", default=800,
+                      help="height of the chart")
+    parser.add_option("--ra", dest="ra", type="float",
+                      help="ra (hours) of the center of a regional chart")
+    parser.add_option("--dec", dest="dec", type="float",
+                      help="dec (degrees) of the center of a regional chart")
+    parser.add_option("--fov", dest="fov", type="float",
+                      help="width in degrees of a regional chart")
+    parser.add_option("--mag_limit", dest="mag_limit", type="float", default=6.5,
+                      help="faintest stars to show on a regional chart")
+    parser.add_option("--profile", dest="profile",
+                      help="write a report of load and drawing times here",
+                      metavar="JSON FILE")
+    parser.add_option("--strict", dest="strict", action="store_true", default=False,
+                      help="stop at malformed catalog rows instead of skipping them")
+    (options, args) = parser.parse_args(argv)
+    if not (options.batch or (options.object_ids and options.output_map)):
         parser.error("all options must be set.  Run with -h to see usage.")
+    regional_options = [options.ra, options.dec, options.fov]
+    if any(o is not None for o in regional_options) and None in regional_options:
+        parser.error("a regional chart needs --ra, --dec and --fov.")
+    return options
+
+
+def main(options, data=None) -> None:
+    """Draws the charts.  data, a WarmData (see watch.py), keeps the
+    catalogs and drawn backgrounds for later commands in the same run."""
+    if options.batch:
+        jobs = read_manifest(options.batch)
+    else:
+        region = None
+        if options.fov is not None:
+            region = Region(options.ra, options.dec, options.fov, options.mag_limit)
+        jobs = [ChartJob(options.object_ids, options.output_map,
+                         options.width, options.height, "", region)]
 
-    stars = read_star_data("data/stars.tsv")
-    con_lines = read_constellation_lines("data/constellation_lines.tsv")
-    milky_way = read_milky_way("data/milkyway.json")
-    dso_data = read_dso_data("../../data/objects.tsv")
+    profile = RenderProfile() if options.profile else None
+    metrics = LoadMetrics(options.strict)
+    if data is None:
+        sky = load_sky_data(profile=profile, metrics=metrics)
+        background = BackgroundCache(options.cache_dir)
+        glyphs = GlyphCache()
+    else:
+        if profile is not None or options.strict:
+            # load again, to time or check the loaders
+            sky = load_sky_data(profile=profile, metrics=metrics)
+        else:
+            sky = data.sky()
+        if data.background is None:
+            data.background = BackgroundCache(options.cache_dir)
+            data.glyphs = GlyphCache()
+        (background, glyphs) = (data.background, data.glyphs)
+    for job in jobs:
+        render(job, sky, background, glyphs, profile)
+    if profile is not None:
+        profile.write(options.profile)
+    if options.batch and metrics.loaders:
+        metrics.print_summary()
 
-    objects = read_object_list(options.object_ids)
-    plot = StarPlot(1280, 800, stars, con_lines, milky_way, dso_data, objects)
-    plot.write_pdf(options.output_map)
+
+if __name__ == "__main__":
+    main(parse_options())
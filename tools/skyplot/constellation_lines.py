@@ -1,10 +1,12 @@
 from dataclasses import dataclass
-from typing import Dict
 from typing import List
 
+import numpy as np
+
 from geometry import Poly
-from geometry import break_into_simple
-from star import Star
+from geometry import from_points
+from geometry import split_polyline
+from star import StarCatalog
 
 
 @dataclass
@@ -29,16 +31,17 @@ def read_constellation_lines(con_lines_file: str) -> List[ConstellationLines]:
     return conlines
 
 
-def to_poly(con: ConstellationLines, stars: Dict[int, Star]) -> Poly:
-    return Poly([stars[c].loc for c in con.star_ids])
-
-
-def to_polys(con_lines: List[ConstellationLines], stars: Dict[int, Star]) -> List[Poly]:
-    return [to_poly(c, stars) for c in con_lines]
+def to_points(con: ConstellationLines, stars: StarCatalog) -> np.ndarray:
+    """Returns the (ra, dec) of the stars along the line as an (n, 2) array."""
+    idx = np.array([stars.index_of(star_id) for star_id in con.star_ids], dtype=np.int64)
+    points = np.empty((len(idx), 2))
+    points[:, 0] = stars.ra[idx]
+    points[:, 1] = stars.dec[idx]
+    return points
 
 
-def to_simple_polys(con_lines: List[ConstellationLines], stars: Dict[int, Star]) -> List[Poly]:
-    complex_polys: List[Poly] = to_polys(con_lines, stars)
-    simple_polys: List[List[Poly]] = [break_into_simple(c) for c in complex_polys]
-    flattened: List[Poly] = [item for sublist in simple_polys for item in sublist]
-    return flattened
+def to_simple_polys(con_lines: List[ConstellationLines], stars: StarCatalog) -> List[Poly]:
+    simple_polys: List[Poly] = []
+    for c in con_lines:
+        simple_polys.extend(from_points(p) for p in split_polyline(to_points(c, stars)))
+    return simple_polys
@@ -1,10 +1,20 @@
-import re
+import math
+import os
+import sys
 from dataclasses import dataclass
 from enum import Enum
 from typing import Dict
 from typing import List
+from typing import Optional
 
 from geometry import SPoint
+from loader_metrics import LoaderMetrics
+
+# the table readers and coordinate parsers are shared with the other tools one directory up
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from coords import parse_dec_column
+from coords import parse_ra_column
+from tsv_tables import read_objects
 
 
 class DsoType(Enum):
@@ -24,61 +34,73 @@ class Dso:
     loc: SPoint
 
 
-def parse_ra(ra_string: str) -> float:
-    """Changes 02h 39m 24s to a float."""
-    digits_only = re.sub("[^0-9. ]+", "", ra_string)
-    h, m, s = digits_only.strip().split(' ')
-    return float(h) + float(m) / 60.0 + float(s) / 3600.0
+# the charted types, by the object table's name for them
+DSO_TYPES = {
+    "Gal": DsoType.GALAXY,
+    "OCl": DsoType.OPEN_CLUSTER,
+    "GCl": DsoType.GLOBULAR_CLUSTER,
+    "PN": DsoType.PLANETARY_NEBULA,
+    "EN": DsoType.BRIGHT_NEBULA,
+    "RN": DsoType.BRIGHT_NEBULA,
+    "SNR": DsoType.BRIGHT_NEBULA,
+    "Ast": DsoType.ASTERISM,
+    "Double": DsoType.DOUBLE,
+    "Carbon": DsoType.CARBON,
+}
 
 
-def parse_dec(dec_string: str) -> float:
-    """Changes a string like 53° 55' 00" to a float."""
-    digits_only = re.sub("[^-0-9. ]+", "", dec_string)
-    d, m, s = digits_only.strip().split(' ')
-    return float(d) + float(m) / 60.0 + float(s) / 3600.0
+def main_type(type_string: str) -> str:
+    return type_string.split('+')[0]
 
 
 def parse_type(type_string: str) -> DsoType:
-    first_type = re.sub("\+.*", "", type_string)
-    if first_type == "Gal":
-        return DsoType.GALAXY
-    elif first_type == "OCl":
-        return DsoType.OPEN_CLUSTER
-    elif first_type == "GCl":
-        return DsoType.GLOBULAR_CLUSTER
-    elif first_type == "PN":
-        return DsoType.PLANETARY_NEBULA
-    elif first_type == "EN" or first_type == "RN" or first_type == "SNR":
-        return DsoType.BRIGHT_NEBULA
-    elif first_type == "Ast":
-        return DsoType.ASTERISM
-    elif first_type == "Double":
-        return DsoType.DOUBLE
-    elif first_type == "Carbon":
-        return DsoType.CARBON
-    else:
+    dso_type = DSO_TYPES.get(main_type(type_string))
+    if dso_type is None:
         raise Exception("unsupported type: " + type_string)
+    return dso_type
+
+
+def read_dso_data(dso_file: str, metrics: Optional[LoaderMetrics] = None) -> Dict[int, Dso]:
+    """Reads dso from a file. Returns a map of id -> dso.
+
+    Objects of types that aren't charted (e.g. the Moon) or with no fixed
+    position are left out; objects with a position that can't be parsed are
+    skipped, and counted in metrics if given.
+    """
+    if metrics is None:
+        metrics = LoaderMetrics()
+
+    ids = []
+    types = []
+    ra_strings = []
+    dec_strings = []
+    with metrics.stage("read_rows"):
+        for row in read_objects(dso_file):
+            metrics.rows_read += 1
+            dso_type = DSO_TYPES.get(main_type(row.obj_type))
+            if dso_type is None:
+                metrics.exclude("uncharted type " + main_type(row.obj_type))
+                continue
+            if not row.ra and not row.dec:
+                metrics.exclude("no position")
+                continue
+            ids.append(row.obj_id)
+            types.append(dso_type)
+            ra_strings.append(row.ra)
+            dec_strings.append(row.dec)
+
+    with metrics.stage("parse_positions"):
+        ra = parse_ra_column(ra_strings)
+        dec = parse_dec_column(dec_strings)
 
-
-def read_dso_data(dso_file: str) -> Dict[int, Dso]:
-    """Reads dso from a file. Returns a map of id -> dso."""
-
-    dfile = open(dso_file, 'r')
-    lines = dfile.readlines()
     dsos = {}
-    for line in lines:
-        if line.startswith('#'):
-            # skip comments
-            continue
-        fields = line.strip().split('\t')
-        try:
-            dso_id = fields[0]
-            dso_type = parse_type(fields[2])
-            ra = parse_ra(fields[4])
-            dec = parse_dec(fields[5])
-            dsos[dso_id] = Dso(dso_type, SPoint(ra, dec))
-        except Exception:
-            pass
+    with metrics.stage("build"):
+        for i in range(len(ids)):
+            if math.isnan(ra[i]) or math.isnan(dec[i]):
+                metrics.skip("bad position", "{} ({}, {})".format(ids[i], ra_strings[i], dec_strings[i]))
+                continue
+            dsos[ids[i]] = Dso(types[i], SPoint(float(ra[i]), float(dec[i])))
+            metrics.rows_parsed += 1
     return dsos
 
 
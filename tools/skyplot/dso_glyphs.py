@@ -0,0 +1,225 @@
+"""
+Symbols for each type of deep sky object.
+
+Each symbol is drawn centered at (0, 0) with a radius of about 10 units.
+New types are added by writing a drawing function and registering it with
+@glyph(DsoType.X).  Because charts can show thousands of objects, a
+GlyphCache draws each symbol once per scale and then stamps that copy at
+every object's position.
+"""
+import math
+from typing import Callable
+from typing import Dict
+from typing import Tuple
+
+import cairo
+
+from dso import DsoType
+
+GlyphDrawer = Callable[[cairo.Context], None]
+GLYPHS: Dict[DsoType, GlyphDrawer] = {}
+
+# half the size of the box, in symbol units, that holds any symbol
+GLYPH_EXTENT = 15.0
+
+
+def set_symbol_stroke(ctx) -> None:
+    """Sets the stroke state every symbol starts from: solid 1 unit lines,
+    as symbols had when they were drawn straight onto the chart after the
+    grid.  Symbols needing other strokes set them themselves."""
+    ctx.set_line_width(1)
+    ctx.set_line_cap(cairo.LINE_CAP_BUTT)
+    ctx.set_line_join(cairo.LINE_JOIN_MITER)
+    ctx.set_dash([])
+
+
+def glyph(dso_type: DsoType):
+    """Decorator to register the function drawing the symbol for dso_type."""
+    def register(draw: GlyphDrawer) -> GlyphDrawer:
+        GLYPHS[dso_type] = draw
+        return draw
+    return register
+
+
+@glyph(DsoType.GLOBULAR_CLUSTER)
+def draw_globular_cluster(ctx):
+    r = 10.0
+    ctx.set_source_rgb(1.0, 1.0, 0.0)
+    ctx.arc(0, 0, r, 0.0, 2 * math.pi)
+    ctx.fill()
+
+    ctx.set_source_rgb(0.0, 0.0, 0.0)
+    ctx.arc(0, 0, r, 0.0, 2 * math.pi)
+    ctx.move_to(-r, 0)
+    ctx.line_to(r, 0)
+    ctx.move_to(0, -r)
+    ctx.line_to(0, r)
+    ctx.stroke()
+
+
+@glyph(DsoType.OPEN_CLUSTER)
+def draw_open_cluster(ctx):
+    r = 10.0
+    ctx.set_source_rgb(1.0, 1.0, 0.0)
+    ctx.arc(0, 0, r, 0.0, 2 * math.pi)
+    ctx.fill()
+
+    ctx.set_line_cap(cairo.LINE_CAP_ROUND)
+    ctx.set_source_rgb(0.0, 0.0, 0.0)
+    ctx.set_dash([0.0, 7.0])
+    ctx.set_line_width(3)
+    ctx.arc(0, 0, r, 0.0, 2 * math.pi)
+    ctx.stroke()
+
+
+@glyph(DsoType.BRIGHT_NEBULA)
+def draw_bright_nebula(ctx):
+    r = 10.0
+    ctx.set_source_rgb(0.0, 1.0, 0.0)
+    ctx.rectangle(-r, -r, 2 * r, 2 * r)
+    ctx.fill()
+    ctx.set_source_rgb(0.0, 0.0, 0.0)
+    ctx.rectangle(-r, -r, 2 * r, 2 * r)
+    ctx.stroke()
+
+
+@glyph(DsoType.ASTERISM)
+def draw_asterism(ctx):
+    r = 10.0
+    ctx.set_source_rgb(0.0, 0.0, 0.0)
+    ctx.move_to(-r, -r)
+    ctx.line_to(r, r)
+    ctx.move_to(r, -r)
+    ctx.line_to(-r, r)
+    ctx.stroke()
+
+
+def ellipse_path(ctx):
+    r = 10
+    ctx.save()
+    ctx.scale(1, 0.5)
+    ctx.arc(0, 0, r, 0.0, 2 * math.pi)
+    ctx.restore()
+
+
+@glyph(DsoType.GALAXY)
+def draw_galaxy(ctx):
+    ellipse_path(ctx)
+    ctx.set_source_rgb(1.0, 0.0, 0.0)
+    ctx.fill()
+    ellipse_path(ctx)
+    ctx.set_source_rgb(0.0, 0.0, 0.0)
+    ctx.stroke()
+
+
+@glyph(DsoType.PLANETARY_NEBULA)
+def draw_planetary_nebula(ctx):
+    r = 10.0
+    green_r = 0.8 * r  # radius of the green dot
+    line_r = 1.2 * r  # radius of the crossing lines
+
+    ctx.set_source_rgb(0.0, 0.0, 0.0)
+    ctx.move_to(-line_r, 0)
+    ctx.line_to(line_r, 0)
+    ctx.move_to(0, -line_r)
+    ctx.line_to(0, line_r)
+    ctx.stroke()
+
+    ctx.set_source_rgb(0.0, 1.0, 0.0)
+    ctx.arc(0, 0, green_r, 0.0, 2 * math.pi)
+    ctx.fill()
+
+    ctx.set_source_rgb(0.0, 0.0, 0.0)
+    ctx.arc(0, 0, green_r, 0.0, 2 * math.pi)
+    ctx.stroke()
+
+
+@glyph(DsoType.CARBON)
+def draw_carbon_star(ctx):
+    r = 10.0
+
+    ctx.set_source_rgb(1.0, 0.5, 0.0)
+    ctx.move_to(-r, 0)
+    ctx.line_to(0, -r)
+    ctx.line_to(r, 0)
+    ctx.line_to(0, r)
+    ctx.close_path()
+    ctx.fill()
+
+    ctx.set_source_rgb(0.0, 0.0, 0.0)
+    ctx.move_to(-r, 0)
+    ctx.line_to(0, -r)
+    ctx.line_to(r, 0)
+    ctx.line_to(0, r)
+    ctx.close_path()
+    ctx.stroke()
+
+
+@glyph(DsoType.DOUBLE)
+def draw_double(ctx):
+    r = 10.0
+    dot_r = 0.6 * r  # radius of the dot
+    line_r = 1.2 * r  # radius of the crossing line
+
+    ctx.save()
+
+    ctx.set_source_rgb(0.0, 0.0, 0.0)
+    ctx.move_to(-line_r, 0)
+    ctx.line_to(line_r, 0)
+    ctx.stroke()
+
+    ctx.set_source_rgb(1.0, 0.0, 1.0)
+    ctx.arc(0, 0, dot_r, 0.0, 2 * math.pi)
+    ctx.fill()
+
+    ctx.set_source_rgb(0.0, 0.0, 0.0)
+    ctx.arc(0, 0, dot_r, 0.0, 2 * math.pi)
+    ctx.stroke()
+    ctx.restore()
+
+
+class GlyphCache:
+    """Pre-drawn symbols, keyed by type, scale and kind of output.
+
+    For vector output ("vector") each symbol is kept as a recording
+    surface so PDFs still get vector symbols; for raster output ("raster")
+    it is kept as a small image and stamped at the nearest whole pixel.
+    """
+
+    def __init__(self):
+        self.stamps: Dict[Tuple[DsoType, float, str], Tuple[cairo.Surface, float]] = {}
+
+    def render(self, dso_type: DsoType, scale: float, kind: str) -> Tuple[cairo.Surface, float]:
+        extent = GLYPH_EXTENT * scale
+        if kind == "raster":
+            size = int(math.ceil(2 * extent))
+            surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, size, size)
+            origin = 0.5 * size
+        else:
+            surface = cairo.RecordingSurface(cairo.CONTENT_COLOR_ALPHA,
+                                             cairo.Rectangle(-extent, -extent, 2 * extent, 2 * extent))
+            origin = 0.0
+        ctx = cairo.Context(surface)
+        ctx.translate(origin, origin)
+        ctx.scale(scale, scale)
+        set_symbol_stroke(ctx)
+        GLYPHS[dso_type](ctx)
+        return surface, origin
+
+    def get(self, dso_type: DsoType, scale: float, kind: str) -> Tuple[cairo.Surface, float]:
+        """Returns the symbol and the offset of its center in the surface."""
+        key = (dso_type, scale, kind)
+        if key not in self.stamps:
+            self.stamps[key] = self.render(dso_type, scale, kind)
+        return self.stamps[key]
+
+    def stamp(self, ctx, dso_type: DsoType, x: float, y: float, scale: float, kind: str) -> None:
+        """Draws the symbol for dso_type centered at (x, y)."""
+        surface, origin = self.get(dso_type, scale, kind)
+        extent = GLYPH_EXTENT * scale
+        if kind == "raster":
+            x = round(x)
+            y = round(y)
+        ctx.set_source_surface(surface, x - origin, y - origin)
+        ctx.rectangle(x - extent, y - extent, 2 * extent, 2 * extent)
+        ctx.fill()
@@ -0,0 +1,88 @@
+"""
+Helpers for compiled caches that live next to the data file they are built from.
+
+A cache file "stars.tsv.cache.npy" is accompanied by a key file
+"stars.tsv.cache.key" recording the size, mtime and sha1 of the source it
+was built from.  A cache is fresh if the size and mtime still match, or
+(e.g., after a checkout touched the file) if the content hash still matches.
+"""
+import hashlib
+import json
+import os
+from typing import Any
+from typing import Dict
+
+
+def cache_path(source_file: str, suffix: str) -> str:
+    return source_file + ".cache" + suffix
+
+
+def key_path(source_file: str) -> str:
+    return cache_path(source_file, ".key")
+
+
+def content_hash(source_file: str) -> str:
+    h = hashlib.sha1()
+    with open(source_file, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def source_hash(source_file: str) -> str:
+    """The sha1 of source_file, taken from its key if the key's size and mtime
+    still match, so files with a fresh cache are not read again."""
+    key = read_key(source_file)
+    st = os.stat(source_file)
+    if key.get("size") == st.st_size and key.get("mtime_ns") == st.st_mtime_ns and "sha1" in key:
+        return key["sha1"]
+    return content_hash(source_file)
+
+
+def make_key(source_file: str, version: int) -> Dict[str, Any]:
+    st = os.stat(source_file)
+    return {"version": version,
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "sha1": content_hash(source_file)}
+
+
+def read_key(source_file: str) -> Dict[str, Any]:
+    try:
+        with open(key_path(source_file), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_key(source_file: str, key: Dict[str, Any]) -> None:
+    write_atomic(key_path(source_file), json.dumps(key).encode('utf-8'))
+
+
+def is_fresh(source_file: str, cache_file: str, version: int) -> bool:
+    """Checks whether cache_file was built from the current source_file."""
+    if not os.path.exists(cache_file):
+        return False
+    key = read_key(source_file)
+    if key.get("version") != version:
+        return False
+    st = os.stat(source_file)
+    if key.get("size") == st.st_size and key.get("mtime_ns") == st.st_mtime_ns:
+        return True
+    if key.get("size") != st.st_size or key.get("sha1") != content_hash(source_file):
+        return False
+    # same content, only touched; remember the new mtime
+    key["mtime_ns"] = st.st_mtime_ns
+    try:
+        write_key(source_file, key)
+    except OSError:
+        pass
+    return True
+
+
+def write_atomic(filename: str, data: bytes) -> None:
+    """Writes data so that readers never see a partially written file."""
+    tmp_file = filename + ".tmp"
+    with open(tmp_file, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_file, filename)
@@ -1,5 +1,9 @@
 from dataclasses import dataclass
+from dataclasses import field
 from typing import List
+from typing import Optional
+
+import numpy as np
 
 
 @dataclass
@@ -9,63 +13,146 @@ class SPoint:
     dec: float
 
 
-def shift_right(p: SPoint) -> SPoint:
-    return SPoint(p.ra + 24, p.dec)
-
-
-def shift_left(p: SPoint) -> SPoint:
-    return SPoint(p.ra - 24, p.dec)
-
+# a jump in ra bigger than this (hours) between vertices crosses the 24 hour line
+SEAM_JUMP = 16.0
 
-def crosses_24_to_0(ra1: float, ra2: float) -> bool:
-    return ra1 - ra2 > 16
 
-
-def crosses_0_to_24(ra1: float, ra2: float) -> bool:
-    return ra1 - ra2 < -16
-
-
-def get_dec_intersection(v1: SPoint, v2: SPoint, ra: float) -> float:
-    """Gets the dec coordinate along the line from v1 to v2 with given ra coordinate."""
-    # Note: if I use spherical geometry to draw lines as proper great
-    # circles, then this would have to be updated as well.
-    dec = v2.dec + (v2.dec - v1.dec) / (v2.ra - v1.ra) * (ra - v2.ra)
-    return dec
+@dataclass
+class Bounds:
+    """Class to hold a box in the sky; ra_min may be < 0 if it crosses 0h."""
+    ra_min: float
+    ra_max: float
+    dec_min: float
+    dec_max: float
 
 
 @dataclass
 class Poly:
     """Class to hold a polygon as a list of points."""
     v: List[SPoint]
+    _bounds: Optional[Bounds] = field(default=None, repr=False, compare=False)
+
+    def bounds(self) -> Bounds:
+        if self._bounds is None:
+            self._bounds = poly_bounds(self)
+        return self._bounds
+
+
+def poly_bounds(poly: Poly) -> Bounds:
+    ras = [p.ra for p in poly.v]
+    decs = [p.dec for p in poly.v]
+    return Bounds(min(ras), max(ras), min(decs), max(decs))
+
+
+def to_points(poly: Poly) -> np.ndarray:
+    """Changes a polygon to an (n, 2) array of ra, dec."""
+    return np.array([(p.ra, p.dec) for p in poly.v], dtype=np.float64).reshape(-1, 2)
+
+
+def from_points(points: np.ndarray) -> Poly:
+    return Poly([SPoint(ra, dec) for ra, dec in points.tolist()])
+
+
+def seam_shifts(ra: np.ndarray, jump: float = SEAM_JUMP) -> np.ndarray:
+    """Returns how many times the path from the first vertex to each vertex
+    has crossed the 24 hour line: +1 going 24h -> 0h, -1 going 0h -> 24h.
+    A change in ra bigger than jump is taken to be such a crossing."""
+    d = np.diff(ra)
+    steps = np.where(d < -jump, 1, np.where(d > jump, -1, 0))
+    return np.concatenate([[0], np.cumsum(steps)])
+
+
+def split_polyline(points: np.ndarray, jump: float = SEAM_JUMP) -> List[np.ndarray]:
+    """Splits a line through (ra, dec) points into pieces that do not cross
+    the 24 hour line, adding a vertex on the line at each end of a cut."""
+    if len(points) < 2:
+        return [points]
+    shifts = seam_shifts(points[:, 0], jump)
+    crossings = np.nonzero(np.diff(shifts))[0]
+    if len(crossings) == 0:
+        return [points]
+
+    # work with ra made continuous, where the crossing is at 24 * k
+    ra = points[:, 0] + 24.0 * shifts
+    dec = points[:, 1]
+    ra1 = ra[crossings]
+    ra2 = ra[crossings + 1]
+    dec1 = dec[crossings]
+    dec2 = dec[crossings + 1]
+    seam = 24.0 * np.maximum(shifts[crossings], shifts[crossings + 1])
+    seam_dec = dec2 + (dec2 - dec1) / (ra2 - ra1) * (seam - ra2)
+    going_up = shifts[crossings + 1] > shifts[crossings]
+    exit_ra = np.where(going_up, 24.0, 0.0)
+    entry_ra = 24.0 - exit_ra
+
+    # insert an exit and an entry vertex after each crossing, then cut between them
+    inserted = np.empty((2 * len(crossings), 2))
+    inserted[0::2, 0] = exit_ra
+    inserted[1::2, 0] = entry_ra
+    inserted[0::2, 1] = seam_dec
+    inserted[1::2, 1] = seam_dec
+    out = np.insert(points, np.repeat(crossings + 1, 2), inserted, axis=0)
+    cuts = crossings + 1 + 2 * np.arange(len(crossings)) + 1
+    return np.split(out, cuts)
+
+
+def clip_half_plane(points: np.ndarray, ra_limit: float, keep_below: bool) -> np.ndarray:
+    """Clips a closed polygon to the part with ra <= ra_limit (or >=).
+
+    This is one Sutherland-Hodgman step done for all edges at once.  Pieces
+    left on both sides of a gap are joined by a zero-width edge along the
+    limit, which does not show when filled.
+    """
+    ra = points[:, 0]
+    inside = ra <= ra_limit if keep_below else ra >= ra_limit
+    nxt = np.roll(points, -1, axis=0)
+    crosses = inside != np.roll(inside, -1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = (ra_limit - ra) / (nxt[:, 0] - ra)
+    t = np.where(crosses, t, 0.0)
+    intersections = points + t[:, np.newaxis] * (nxt - points)
+    intersections[:, 0] = ra_limit
+
+    # each edge outputs its start vertex if inside, then its crossing if any
+    candidates = np.stack([points, intersections], axis=1).reshape(-1, 2)
+    keep = np.stack([inside, crosses], axis=1).reshape(-1)
+    return candidates[keep]
+
+
+def wraps_around(points: np.ndarray, jump: float = SEAM_JUMP) -> bool:
+    """Checks whether a closed polygon goes all the way around the sky."""
+    closed = np.concatenate([points, points[:1]])
+    return seam_shifts(closed[:, 0], jump)[-1] != 0
+
+
+def split_polygon(points: np.ndarray, jump: float = SEAM_JUMP) -> List[np.ndarray]:
+    """Splits a closed polygon into filled pieces that do not cross the 24
+    hour line, however many times it crosses it.
+
+    Polygons going all the way around the sky (around a pole) cannot be
+    split this way and are returned unchanged.
+    """
+    if len(points) < 3 or wraps_around(points, jump):
+        return [points]
+    shifts = seam_shifts(points[:, 0], jump)
+    if not shifts.any():
+        return [points]
+
+    unwrapped = points.copy()
+    unwrapped[:, 0] += 24.0 * shifts
+    pieces = []
+    for k in range(int(shifts.min()), int(shifts.max()) + 1):
+        piece = clip_half_plane(unwrapped, 24.0 * k, keep_below=False)
+        piece = clip_half_plane(piece, 24.0 * (k + 1), keep_below=True)
+        if len(piece) >= 3:
+            piece[:, 0] -= 24.0 * k
+            pieces.append(piece)
+    return pieces
 
 
 def break_into_simple(orig: Poly) -> List[Poly]:
     """Breaks this polygon into a list of simple ones that do not cross the 24 hour line."""
-    simple_polys: List[Poly] = []
-    curr_poly: List[SPoint] = [orig.v[0]]
-    for i in range(1, len(orig.v)):
-        prev_vertex = orig.v[i - 1]
-        curr_vertex = orig.v[i]
-        if crosses_24_to_0(prev_vertex.ra, curr_vertex.ra):
-            curr_vertex_24: SPoint = shift_right(curr_vertex)
-            dec: float = get_dec_intersection(prev_vertex, curr_vertex_24, 24)
-            p24: SPoint = SPoint(24, dec)
-            p0: SPoint = SPoint(0, dec)
-            curr_poly.append(p24)
-            simple_polys.append(Poly(curr_poly))
-            curr_poly = [p0, curr_vertex]
-        elif crosses_0_to_24(prev_vertex.ra, curr_vertex.ra):
-            curr_vertex_0: SPoint = shift_left(curr_vertex)
-            dec: float = get_dec_intersection(prev_vertex, curr_vertex_0, 0)
-            p24: SPoint = SPoint(24, dec)
-            p0: SPoint = SPoint(0, dec)
-            curr_poly.append(p0)
-            simple_polys.append(Poly(curr_poly))
-            curr_poly = [p24, curr_vertex]
-        else:
-            curr_poly.append(curr_vertex)
-    simple_polys.append(Poly(curr_poly))
-    return simple_polys
+    return [from_points(p) for p in split_polyline(to_points(orig))]
 
 
 if __name__ == "__main__":
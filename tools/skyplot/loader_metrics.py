@@ -0,0 +1,87 @@
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List
+
+
+class LoaderMetrics:
+    """Counts what a catalog loader did with its rows, and times its stages.
+
+    Rows are either parsed, excluded (valid, but not something charts
+    show, like the Moon) or skipped (malformed).  In strict mode a skipped
+    row raises a ValueError instead.  The first row skipped for each reason
+    is kept as an example.
+    """
+
+    def __init__(self, strict: bool = False):
+        self.strict = strict
+        self.rows_read = 0
+        self.rows_parsed = 0
+        self.excluded: Counter = Counter()
+        self.skipped: Counter = Counter()
+        self.examples: Dict[str, str] = {}
+        self.seconds: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - start
+
+    def exclude(self, reason: str) -> None:
+        self.excluded[reason] += 1
+
+    def skip(self, reason: str, row: str) -> None:
+        if self.strict:
+            raise ValueError("{}: {!r}".format(reason, row))
+        self.skipped[reason] += 1
+        self.examples.setdefault(reason, row)
+
+    def merge(self, other: "LoaderMetrics") -> None:
+        self.rows_read += other.rows_read
+        self.rows_parsed += other.rows_parsed
+        self.excluded.update(other.excluded)
+        self.skipped.update(other.skipped)
+        for reason, row in other.examples.items():
+            self.examples.setdefault(reason, row)
+        for name, seconds in other.seconds.items():
+            self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    def summary(self) -> List[str]:
+        if self.rows_read == 0 and "load_cache" in self.seconds:
+            return ["read from the compiled cache in {:.3f}s".format(self.seconds["load_cache"])]
+        lines = ["{} rows read, {} parsed, {} excluded, {} skipped".format(
+            self.rows_read, self.rows_parsed, sum(self.excluded.values()), sum(self.skipped.values()))]
+        for reason, n in self.skipped.most_common():
+            lines.append("  skipped {:6d}  {}  (e.g. {!r})".format(n, reason, self.examples[reason]))
+        for reason, n in self.excluded.most_common():
+            lines.append("  excluded {:5d}  {}".format(n, reason))
+        lines.append("  " + ", ".join("{} {:.3f}s".format(name, s) for name, s in self.seconds.items()))
+        return lines
+
+
+class LoadMetrics:
+    """The metrics of each loader, by name, e.g. for all the loads of a batch."""
+
+    def __init__(self, strict: bool = False):
+        self.strict = strict
+        self.loaders: Dict[str, LoaderMetrics] = {}
+
+    def loader(self, name: str) -> LoaderMetrics:
+        if name not in self.loaders:
+            self.loaders[name] = LoaderMetrics(self.strict)
+        return self.loaders[name]
+
+    def merge(self, other: "LoadMetrics") -> None:
+        for name, metrics in other.loaders.items():
+            self.loader(name).merge(metrics)
+
+    def print_summary(self) -> None:
+        for name, metrics in self.loaders.items():
+            lines = metrics.summary()
+            print("{}: {}".format(name, lines[0]))
+            for line in lines[1:]:
+                print(line)
+
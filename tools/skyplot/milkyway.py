@@ -1,9 +1,26 @@
+import io
 import json
 from dataclasses import dataclass
+from dataclasses import field
+from typing import Dict
 from typing import List
 
+import numpy as np
+
+from file_cache import cache_path
+from file_cache import is_fresh
+from file_cache import make_key
+from file_cache import write_atomic
+from file_cache import write_key
 from geometry import Poly
 from geometry import SPoint
+from geometry import from_points
+from geometry import split_polygon
+from geometry import wraps_around
+
+# Simplification tolerances, in degrees, of the precomputed levels of detail.
+LOD_TOLERANCES = [0.0, 0.05, 0.1, 0.2, 0.5, 1.0]
+MILKY_WAY_CACHE_VERSION = 2
 
 
 @dataclass
@@ -13,7 +30,23 @@ class MilkyWayLayer:
 
 @dataclass
 class MilkyWay:
+    """The milky way, at full detail in layers and simplified at each of
+    LOD_TOLERANCES in level_arrays (see to_arrays)."""
     layers: List[MilkyWayLayer]
+    level_arrays: List[Dict[str, np.ndarray]] = field(default_factory=list, repr=False)
+    _levels: Dict[int, List[MilkyWayLayer]] = field(default_factory=dict, repr=False)
+
+    def layers_for(self, deg_per_pixel: float) -> List[MilkyWayLayer]:
+        """Returns the coarsest layers whose error is at most half a pixel."""
+        level = 0
+        for idx, tolerance in enumerate(LOD_TOLERANCES):
+            if tolerance <= 0.5 * deg_per_pixel and idx < len(self.level_arrays):
+                level = idx
+        if level == 0:
+            return self.layers
+        if level not in self._levels:
+            self._levels[level] = from_arrays(self.level_arrays[level])
+        return self._levels[level]
 
 
 def rotate_to_0_hour(poly: Poly) -> Poly:
@@ -47,17 +80,7 @@ def fix_layer_hack(layer: MilkyWayLayer) -> MilkyWayLayer:
     return MilkyWayLayer(new_polys)
 
 
-def num_24h_crosses(poly: Poly) -> int:
-    num_breaks = 0
-    for idx in range(1, len(poly.v)):
-        ra1 = poly.v[idx - 1].ra
-        ra2 = poly.v[idx].ra
-        if abs(ra1 - ra2) > 1:
-            num_breaks += 1
-    return num_breaks
-
-
-def read_milky_way(mw_file: str) -> MilkyWay:
+def parse_milky_way(mw_file: str) -> List[MilkyWayLayer]:
     f = open(mw_file)
     data = json.load(f)
 
@@ -67,19 +90,14 @@ def read_milky_way(mw_file: str) -> MilkyWay:
         coords = feature["geometry"]["coordinates"]
         polys: List[Poly] = []
         for poly in coords:
-            spoints: List[SPoint] = []
-            for point in poly:
-                alpha = float(point[0])
-                if alpha < 0:
-                    alpha += 360.0
-                ra = alpha / 15.0  # convert to hours
-                dec = float(point[1])
-                spoints.append(SPoint(ra, dec))
-            if num_24h_crosses(Poly(spoints)) != 2:
-                # Hack to simply ignore the few smaller polys that cross
-                # over the 24 hour line. Slightly better would be to split
-                # into two separate simple polys.
-                polys.append(Poly(spoints))
+            points = np.array(poly, dtype=np.float64)
+            alpha = points[:, 0]
+            points[:, 0] = np.where(alpha < 0, alpha + 360.0, alpha) / 15.0  # convert to hours
+            if wraps_around(points):
+                # the two outlines circling the sky are joined by fix_layer_hack
+                polys.append(from_points(points))
+            else:
+                polys.extend(from_points(p) for p in split_polygon(points))
         layer = MilkyWayLayer(polys)
         if first_layer:
             layer = fix_layer_hack(layer)
@@ -87,7 +105,108 @@ def read_milky_way(mw_file: str) -> MilkyWay:
         layers.append(layer)
     f.close()
 
-    return MilkyWay(layers)
+    return layers
+
+
+def point_segment_distance(points: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Distance from each of the points to the segment from a to b."""
+    ab = b - a
+    length2 = float(np.dot(ab, ab))
+    if length2 == 0.0:
+        return np.hypot(points[:, 0] - a[0], points[:, 1] - a[1])
+    t = np.clip(((points - a) @ ab) / length2, 0.0, 1.0)
+    closest = a + t[:, np.newaxis] * ab
+    return np.hypot(points[:, 0] - closest[:, 0], points[:, 1] - closest[:, 1])
+
+
+def simplify(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """Douglas-Peucker simplification of an (n, 2) array of points."""
+    n = len(points)
+    if tolerance <= 0 or n < 3:
+        return points
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j <= i + 1:
+            continue
+        dist = point_segment_distance(points[i + 1:j], points[i], points[j])
+        k = int(np.argmax(dist))
+        if dist[k] > tolerance:
+            keep[i + 1 + k] = True
+            stack.append((i, i + 1 + k))
+            stack.append((i + 1 + k, j))
+    return points[keep]
+
+
+def to_arrays(layers: List[MilkyWayLayer], tolerance: float) -> Dict[str, np.ndarray]:
+    """Flattens the layers into arrays, simplifying each polygon.
+
+    coords holds (ra, dec) of every vertex, polys the offset in coords of
+    each polygon's first vertex and layers the index of each layer's first
+    polygon; both offset arrays end with the total count.  Polygons that
+    simplify to fewer than 3 vertices are dropped.
+    """
+    coords = []
+    poly_offsets = [0]
+    layer_offsets = [0]
+    for layer in layers:
+        for poly in layer.polys:
+            points = np.array([(p.ra, p.dec) for p in poly.v], dtype=np.float64)
+            # simplify in degrees so ra and dec are on the same scale
+            points[:, 0] *= 15.0
+            points = simplify(points, tolerance)
+            points[:, 0] /= 15.0
+            if len(points) < 3:
+                continue
+            coords.append(points)
+            poly_offsets.append(poly_offsets[-1] + len(points))
+        layer_offsets.append(len(poly_offsets) - 1)
+    return {"coords": np.concatenate(coords).astype(np.float32),
+            "polys": np.array(poly_offsets, dtype=np.int64),
+            "layers": np.array(layer_offsets, dtype=np.int64)}
+
+
+def from_arrays(arrays: Dict[str, np.ndarray]) -> List[MilkyWayLayer]:
+    coords = arrays["coords"].tolist()
+    poly_offsets = arrays["polys"].tolist()
+    layer_offsets = arrays["layers"].tolist()
+    layers = []
+    for layer_idx in range(len(layer_offsets) - 1):
+        polys = []
+        for poly_idx in range(layer_offsets[layer_idx], layer_offsets[layer_idx + 1]):
+            points = coords[poly_offsets[poly_idx]:poly_offsets[poly_idx + 1]]
+            polys.append(Poly([SPoint(ra, dec) for ra, dec in points]))
+        layers.append(MilkyWayLayer(polys))
+    return layers
+
+
+def read_milky_way(mw_file: str, use_cache: bool = True) -> MilkyWay:
+    """Reads the milky way, along with simplified versions for small charts.
+
+    The result is compiled to mw_file + ".cache.npz" the first time, so
+    later runs skip parsing the json and simplifying the outlines.
+    """
+    npz_file = cache_path(mw_file, ".npz")
+    if use_cache and is_fresh(mw_file, npz_file, MILKY_WAY_CACHE_VERSION):
+        with np.load(npz_file) as data:
+            levels = [{name: data["{}_{}".format(name, idx)] for name in ("coords", "polys", "layers")}
+                      for idx in range(len(LOD_TOLERANCES))]
+        return MilkyWay(from_arrays(levels[0]), levels)
+
+    layers = parse_milky_way(mw_file)
+    levels = [to_arrays(layers, tolerance) for tolerance in LOD_TOLERANCES]
+    if use_cache:
+        try:
+            buf = io.BytesIO()
+            np.savez(buf, **{"{}_{}".format(name, idx): level[name]
+                             for idx, level in enumerate(levels) for name in level})
+            write_atomic(npz_file, buf.getvalue())
+            write_key(mw_file, make_key(mw_file, MILKY_WAY_CACHE_VERSION))
+        except OSError:
+            pass
+    return MilkyWay(layers, levels)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,121 @@
+import json
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+# Drawing calls counted by CountingContext, and the counter each adds to.
+# vertices counts move_to and line_to calls; arcs and rectangles are
+# counted separately, not as vertices.
+COUNTED_CALLS = {
+    "arc": "arcs",
+    "rectangle": "rectangles",
+    "move_to": "vertices",
+    "line_to": "vertices",
+    "fill": "fills",
+    "stroke": "strokes",
+    "paint": "paints",
+    "show_text": "texts",
+}
+COUNTERS = ["arcs", "rectangles", "vertices", "fills", "strokes", "paints", "texts"]
+
+
+class CountingContext:
+    """Passes calls on to a cairo context, counting the drawing calls."""
+
+    def __init__(self, ctx, counts: Dict[str, int]):
+        self._ctx = ctx
+        self._counts = counts
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._ctx, name)
+        counter = COUNTED_CALLS.get(name)
+        if counter is None:
+            return attr
+        counts = self._counts
+
+        def counted(*args, **kwargs):
+            counts[counter] += 1
+            return attr(*args, **kwargs)
+        return counted
+
+
+def new_layer() -> Dict[str, Any]:
+    layer: Dict[str, Any] = {"calls": 0, "seconds": 0.0}
+    layer.update((c, 0) for c in COUNTERS)
+    return layer
+
+
+class RenderProfile:
+    """Times the catalog loaders and each layer of each chart drawn.
+
+    Layers are timed around the Python drawing calls, including cairo's work
+    for them on image surfaces; recorded (vector) backgrounds are mostly
+    drawn when they are painted, so that shows up under paint_background.
+    A layer drawn more than once for a chart (e.g. DSOs on a cached
+    background) adds up.  Times are wall clock seconds.
+    """
+
+    def __init__(self):
+        self.loaders: Dict[str, float] = {}
+        self.catalog: Dict[str, int] = {}
+        self.charts: List[Dict[str, Any]] = []
+        self._chart: Optional[Dict[str, Any]] = None
+
+    @contextmanager
+    def loader(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.loaders[name] = self.loaders.get(name, 0.0) + time.perf_counter() - start
+
+    @contextmanager
+    def chart(self, output_file: str, width: int, height: int):
+        """Collects the layers drawn inside the block as one chart."""
+        self._chart = {"output": output_file, "width": width, "height": height,
+                       "seconds": 0.0, "layers": {}}
+        start = time.perf_counter()
+        try:
+            yield self._chart
+        finally:
+            self._chart["seconds"] = time.perf_counter() - start
+            self.charts.append(self._chart)
+            self._chart = None
+
+    @contextmanager
+    def layer(self, name: str, ctx=None):
+        """Times the block as a layer of the current chart.  Yields ctx
+        wrapped so its drawing calls are counted."""
+        if self._chart is None:
+            # not drawing a chart; time it, but leave it out of the report
+            layer = new_layer()
+        else:
+            layer = self._chart["layers"].setdefault(name, new_layer())
+        start = time.perf_counter()
+        try:
+            yield CountingContext(ctx, layer) if ctx is not None else None
+        finally:
+            layer["seconds"] += time.perf_counter() - start
+            layer["calls"] += 1
+
+    def layer_totals(self) -> Dict[str, Dict[str, Any]]:
+        totals: Dict[str, Dict[str, Any]] = {}
+        for chart in self.charts:
+            for name, layer in chart["layers"].items():
+                total = totals.setdefault(name, new_layer())
+                for k, v in layer.items():
+                    total[k] += v
+        return totals
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "loaders": self.loaders,
+            "catalog": self.catalog,
+            "charts": self.charts,
+            "layer_totals": self.layer_totals(),
+        }
+
+    def write(self, report_file: str) -> None:
+        with open(report_file, 'w') as rfile:
+            json.dump(self.report(), rfile, indent=2)
+            rfile.write('\n')
@@ -0,0 +1,107 @@
+import hashlib
+import os
+from contextlib import nullcontext
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from constellation_lines import ConstellationLines
+from constellation_lines import read_constellation_lines
+from constellation_lines import to_simple_polys
+from dso import Dso
+from dso import read_dso_data
+from file_cache import source_hash
+from geometry import Poly
+from loader_metrics import LoadMetrics
+from milkyway import MilkyWay
+from milkyway import read_milky_way
+from render_profile import RenderProfile
+from sky_grid import StarGrid
+from star import StarCatalog
+from star import read_star_data
+
+SKYPLOT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(SKYPLOT_DIR, "data")
+OBJECTS_FILE = os.path.join(SKYPLOT_DIR, "..", "..", "data", "objects.tsv")
+
+
+class SkyData:
+    """The catalogs charts are drawn from.
+
+    Geometry derived from the catalogs (constellation line polygons, the
+    star grid) is computed on first use and then shared by every chart
+    drawn from the same SkyData.  version identifies the contents of the
+    star, constellation and milky way files, if known, so that cached
+    drawings of them can be reused across runs.
+    """
+
+    def __init__(self, stars: StarCatalog, con_lines: List[ConstellationLines],
+                 milky_way: MilkyWay, dso_data: Dict[str, Dso], version: str = ""):
+        self.version = version
+        self.stars = stars
+        self.con_lines = con_lines
+        self.milky_way = milky_way
+        self.dso_data = dso_data
+        self._con_polys: Optional[List[Poly]] = None
+        self._star_grid: Optional[StarGrid] = None
+
+    @property
+    def con_polys(self) -> List[Poly]:
+        if self._con_polys is None:
+            self._con_polys = to_simple_polys(self.con_lines, self.stars)
+        return self._con_polys
+
+    @property
+    def star_grid(self) -> StarGrid:
+        if self._star_grid is None:
+            self._star_grid = StarGrid(self.stars)
+        return self._star_grid
+
+
+def load_sky_data(data_dir: str = DATA_DIR, objects_file: str = OBJECTS_FILE,
+                  profile: Optional[RenderProfile] = None,
+                  metrics: Optional[LoadMetrics] = None) -> SkyData:
+    """Reads the star, constellation, milky way and object catalogs.
+
+    If profile is given, each loader is timed, and the catalog sizes noted.
+    If metrics is given, the star and object loaders count their rows in it.
+    """
+    if metrics is None:
+        metrics = LoadMetrics()
+    star_file = os.path.join(data_dir, "stars.tsv")
+    con_lines_file = os.path.join(data_dir, "constellation_lines.tsv")
+    milky_way_file = os.path.join(data_dir, "milkyway.json")
+
+    def timed(name: str):
+        return profile.loader(name) if profile is not None else nullcontext()
+
+    with timed("read_star_data"):
+        stars = read_star_data(star_file, metrics.loader("stars"))
+    with timed("read_constellation_lines"):
+        con_lines = read_constellation_lines(con_lines_file)
+    with timed("read_milky_way"):
+        milky_way = read_milky_way(milky_way_file)
+    with timed("read_dso_data"):
+        dso_data = read_dso_data(objects_file, metrics.loader("objects"))
+
+    with timed("hash_catalogs"):
+        # the star and milky way hashes come from their cache keys, written
+        # or checked by the loaders above
+        version = hashlib.sha1()
+        for f in [star_file, con_lines_file, milky_way_file]:
+            version.update(source_hash(f).encode('utf-8'))
+    sky = SkyData(stars, con_lines, milky_way, dso_data, version.hexdigest())
+
+    if profile is not None:
+        # derived geometry is otherwise built by the first chart needing it
+        with timed("con_polys"):
+            sky.con_polys
+        with timed("star_grid"):
+            sky.star_grid
+        profile.catalog.update({
+            "stars": len(stars),
+            "constellation_lines": len(con_lines),
+            "milky_way_points": sum(len(p.v) for layer in milky_way.layers for p in layer.polys),
+            "dsos": len(dso_data),
+        })
+    return sky
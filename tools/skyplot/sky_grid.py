@@ -0,0 +1,75 @@
+import math
+
+import numpy as np
+
+from star import StarCatalog
+
+
+class StarGrid:
+    """Partitions a star catalog into RA/Dec cells for fast regional lookups.
+
+    Stars are ordered by cell and, within each cell, by magnitude, so a
+    query only visits the cells overlapping the region and, in each cell,
+    only the stars brighter than the limiting magnitude.
+    """
+
+    def __init__(self, stars: StarCatalog, ra_cells: int = 96, dec_cells: int = 72):
+        self.stars = stars
+        self.ra_cells = ra_cells
+        self.dec_cells = dec_cells
+        self.cell_ra = 24.0 / ra_cells
+        self.cell_dec = 180.0 / dec_cells
+
+        ra_idx = np.clip((stars.ra / self.cell_ra).astype(np.int64), 0, ra_cells - 1)
+        dec_idx = np.clip(((stars.dec + 90.0) / self.cell_dec).astype(np.int64), 0, dec_cells - 1)
+        cell = dec_idx * ra_cells + ra_idx
+
+        self.order = np.lexsort((stars.mag, cell))
+        self.sorted_mag = np.asarray(stars.mag)[self.order]
+        self.cell_start = np.searchsorted(cell[self.order], np.arange(ra_cells * dec_cells + 1))
+
+    def dec_rows(self, dec_min: float, dec_max: float) -> range:
+        first = max(0, int(math.floor((dec_min + 90.0) / self.cell_dec)))
+        last = min(self.dec_cells - 1, int(math.floor((dec_max + 90.0) / self.cell_dec)))
+        return range(first, last + 1)
+
+    def ra_columns(self, ra_min: float, ra_max: float) -> range:
+        if ra_max - ra_min >= 24.0:
+            return range(self.ra_cells)
+        first = int(math.floor(ra_min / self.cell_ra))
+        last = int(math.floor(ra_max / self.cell_ra))
+        if last - first + 1 >= self.ra_cells:
+            # the ends wrap around to the same cells; visit each once
+            return range(self.ra_cells)
+        return range(first, last + 1)
+
+    def query(self, ra_min: float, ra_max: float, dec_min: float, dec_max: float,
+              mag_limit: float) -> np.ndarray:
+        """Returns the sorted indices of stars in the window no fainter than mag_limit.
+
+        ra_min may be negative (or ra_max above 24) for windows crossing 0h.
+        """
+        pieces = []
+        for row in self.dec_rows(dec_min, dec_max):
+            for col in self.ra_columns(ra_min, ra_max):
+                cell = row * self.ra_cells + col % self.ra_cells
+                start = self.cell_start[cell]
+                end = self.cell_start[cell + 1]
+                num_bright = np.searchsorted(self.sorted_mag[start:end], mag_limit, side='right')
+                pieces.append(self.order[start:start + num_bright])
+        if not pieces:
+            return np.zeros(0, dtype=np.int64)
+        idx = np.concatenate(pieces)
+
+        # cells are coarser than the window; trim the stars at its edges
+        ra = np.asarray(self.stars.ra[idx], dtype=np.float64)
+        dec = np.asarray(self.stars.dec[idx], dtype=np.float64)
+        inside = (dec >= dec_min) & (dec <= dec_max)
+        if ra_max - ra_min < 24.0:
+            ra = (ra - ra_min) % 24.0 + ra_min
+            inside &= (ra <= ra_max)
+        return np.sort(idx[inside])
+
+    def stars_in(self, ra_min: float, ra_max: float, dec_min: float, dec_max: float,
+                 mag_limit: float) -> StarCatalog:
+        return self.stars.subset(self.query(ra_min, ra_max, dec_min, dec_max, mag_limit))
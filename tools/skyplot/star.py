@@ -1,7 +1,23 @@
+import io
+import os
+import sys
 from dataclasses import dataclass
-from typing import Dict
+from typing import Optional
 
+import numpy as np
+
+from file_cache import cache_path
+from file_cache import is_fresh
+from file_cache import make_key
+from file_cache import write_atomic
+from file_cache import write_key
 from geometry import SPoint
+from loader_metrics import LoaderMetrics
+
+# the coordinate parsers are shared with the other tools one directory up
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from coords import parse_dec_column
+from coords import parse_ra_column
 
 
 @dataclass
@@ -10,45 +26,145 @@ class Star:
     mag: float
 
 
-def parse_ra(ra_string: str) -> float:
-    if len(ra_string) != 8:
-        raise Exception("Expected 8 digits for ra_string")
-    hour = int(ra_string[0:2])
-    minute = int(ra_string[2:4])
-    second = float(ra_string[4:8])
-    ra = hour + minute / 60.0 + second / 3600.0
-    return ra
-
-
-def parse_dec(dec_string: str) -> float:
-    if len(dec_string) != 7:
-        raise Exception("Expected 7 digits for dec_string")
-    sign = 1.0 if dec_string[0] == '+' else -1.0
-    degree = int(dec_string[1:3])
-    minute = int(dec_string[3:5])
-    second = int(dec_string[5:7])
-    dec = sign * (degree + minute / 60.0 + second / 3600.0)
-    return dec
-
-
-def read_star_data(star_file: str) -> Dict[int, Star]:
-    """Reads star data from a file. Returns a map of id -> star."""
-
-    sfile = open(star_file, 'r')
-    lines = sfile.readlines()
-    stars = {}
-    for line in lines:
-        if line.startswith('#'):
-            # skip comments
-            continue
-        fields = line.strip().split('\t')
-        try:
-            star_id = int(fields[0])
-            ra = parse_ra(fields[4])
-            dec = parse_dec(fields[5])
-            mag = float(fields[6])
-            stars[star_id] = Star(SPoint(ra, dec), mag)
-        except Exception:
-            pass
+# Layout of the compiled star catalog; bump the version when it changes.
+STAR_DTYPE = np.dtype([("id", "<i4"), ("ra", "<f4"), ("dec", "<f4"), ("mag", "<f4")])
+STAR_CACHE_VERSION = 2
+
+
+def parse_star_file(star_file: str, metrics: Optional[LoaderMetrics] = None) -> np.ndarray:
+    """Parses the tsv star file into an array of STAR_DTYPE.
+
+    Malformed rows are skipped, and counted in metrics if given.
+    """
+    if metrics is None:
+        metrics = LoaderMetrics()
+
+    ids = []
+    ra_strings = []
+    dec_strings = []
+    mags = []
+    with metrics.stage("read_rows"), open(star_file, 'r') as sfile:
+        for line in sfile:
+            if line.startswith('#'):
+                # skip comments
+                continue
+            metrics.rows_read += 1
+            fields = line.strip().split('\t')
+            if len(fields) < 7:
+                metrics.skip("missing fields", line.strip())
+                continue
+            try:
+                star_id = int(fields[0])
+            except ValueError:
+                metrics.skip("bad id", line.strip())
+                continue
+            try:
+                mag = float(fields[6])
+            except ValueError:
+                metrics.skip("bad magnitude", line.strip())
+                continue
+            ids.append(star_id)
+            ra_strings.append(fields[4])
+            dec_strings.append(fields[5])
+            mags.append(mag)
 
+    with metrics.stage("parse_positions"):
+        ra = parse_ra_column(ra_strings)
+        dec = parse_dec_column(dec_strings)
+    valid = ~(np.isnan(ra) | np.isnan(dec))
+    for i in np.nonzero(~valid)[0]:
+        metrics.skip("bad position", "{} ({}, {})".format(ids[i], ra_strings[i], dec_strings[i]))
+    metrics.rows_parsed += int(valid.sum())
+    stars = np.zeros(int(valid.sum()), dtype=STAR_DTYPE)
+    stars["id"] = np.array(ids, dtype=np.int64)[valid]
+    stars["ra"] = ra[valid]
+    stars["dec"] = dec[valid]
+    stars["mag"] = np.array(mags)[valid]
     return stars
+
+
+def load_star_array(star_file: str, use_cache: bool = True,
+                    metrics: Optional[LoaderMetrics] = None) -> np.ndarray:
+    """Returns the stars as an array of STAR_DTYPE.
+
+    The parsed catalog is compiled to star_file + ".cache.npy" the first
+    time it is read, and later runs memory-map that file instead of parsing
+    the text again.  The cache is rebuilt whenever star_file changes.
+    Metrics (if given) only count rows when the text is parsed, which it
+    always is in strict mode.
+    """
+    if metrics is None:
+        metrics = LoaderMetrics()
+    if not use_cache or metrics.strict:
+        # (strict checks need the rows, so the cache is not read)
+        return parse_star_file(star_file, metrics)
+
+    npy_file = cache_path(star_file, ".npy")
+    if is_fresh(star_file, npy_file, STAR_CACHE_VERSION):
+        with metrics.stage("load_cache"):
+            return np.load(npy_file, mmap_mode='r')
+
+    stars = parse_star_file(star_file, metrics)
+    try:
+        with metrics.stage("write_cache"):
+            buf = io.BytesIO()
+            np.save(buf, stars)
+            write_atomic(npy_file, buf.getvalue())
+            write_key(star_file, make_key(star_file, STAR_CACHE_VERSION))
+    except OSError:
+        # read-only data directory; just use the parsed copy
+        pass
+    return stars
+
+
+class StarCatalog:
+    """Star data held as columns: ids, ra (hours), dec (degrees) and mag.
+
+    Columns are numpy arrays sorted by id, so batches of stars can be
+    projected and filtered at once.  Looking up a single star by id with
+    catalog[star_id] is still supported for things like constellation lines.
+    """
+
+    def __init__(self, ids: np.ndarray, ra: np.ndarray, dec: np.ndarray, mag: np.ndarray):
+        if len(ids) > 1 and not np.all(ids[1:] > ids[:-1]):
+            order = np.argsort(ids, kind="stable")
+            ids, ra, dec, mag = ids[order], ra[order], dec[order], mag[order]
+        self.ids = ids
+        self.ra = ra
+        self.dec = dec
+        self.mag = mag
+
+    @staticmethod
+    def from_array(stars: np.ndarray) -> "StarCatalog":
+        return StarCatalog(stars["id"], stars["ra"], stars["dec"], stars["mag"])
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def index_of(self, star_id: int) -> int:
+        idx = int(np.searchsorted(self.ids, star_id))
+        if idx >= len(self.ids) or self.ids[idx] != star_id:
+            raise KeyError(star_id)
+        return idx
+
+    def __contains__(self, star_id: int) -> bool:
+        try:
+            self.index_of(star_id)
+            return True
+        except KeyError:
+            return False
+
+    def __getitem__(self, star_id: int) -> Star:
+        idx = self.index_of(star_id)
+        return Star(SPoint(float(self.ra[idx]), float(self.dec[idx])), float(self.mag[idx]))
+
+    def subset(self, selection: np.ndarray) -> "StarCatalog":
+        """Returns the stars picked by a boolean mask or (sorted) index array."""
+        return StarCatalog(self.ids[selection], self.ra[selection],
+                           self.dec[selection], self.mag[selection])
+
+
+def read_star_data(star_file: str, metrics: Optional[LoaderMetrics] = None) -> StarCatalog:
+    """Reads star data from a file. Returns a catalog indexed by star id."""
+
+    return StarCatalog.from_array(load_star_array(star_file, metrics=metrics))
@@ -1,16 +1,27 @@
+import hashlib
 import math
+import os
+import sys
+from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import Dict
 from typing import List
+from typing import Optional
 
 import cairo
+import numpy as np
 
-from constellation_lines import ConstellationLines
-from constellation_lines import to_simple_polys
-from dso import Dso
-from dso import DsoType
-from milkyway import MilkyWay
-from star import Star
+from dso_glyphs import GLYPHS
+from dso_glyphs import GlyphCache
+from dso_glyphs import set_symbol_stroke
+from geometry import Bounds
+from geometry import Poly
+from render_profile import RenderProfile
+from sky_data import SkyData
+
+# the output writers are shared with the other tools one directory up
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from chart_outputs import OutputSpec
+from chart_outputs import write_outputs
 
 
 @dataclass
@@ -19,208 +30,229 @@ class Point:
     y: float
 
 
-class Frame:
-    """Represents a plot of the sky in the designated rectangle."""
+# size of DSO symbols relative to the ones drawn in dso_glyphs
+DSO_SCALE = 0.4
 
-    def __init__(self, left: float, top: float, width: float, height: float):
-        self.left = left
-        self.top = top
-        self.width = width
-        self.height = height
-        self.right = self.left + width
-        self.bottom = self.top + height
+# magnitude at which star dots shrink to nothing on the full sky chart
+DEFAULT_MAG_LIMIT = 3.5 / 0.55
 
-    def ra_to_x(self, ra: float) -> float:
-        return self.left + self.width * (24.0 - ra) / 24.0
 
-    def dec_to_y(self, dec: float) -> float:
-        return self.top + self.height * (90.0 - dec) / 180.0
+def star_radius(mag: np.ndarray, mag_limit: float = DEFAULT_MAG_LIMIT) -> np.ndarray:
+    """Radius of the dot for stars of the given magnitudes; <= 0 means not drawn."""
+    # return 0.09 * mag * mag - 1.0 * mag + 3.4
+    return 0.55 * (mag_limit - mag)
 
 
-class StarPlot:
+FULL_SKY = Bounds(0.0, 24.0, -90.0, 90.0)
 
-    def __init__(self, width: int, height: int, stars: Dict[int, Star],
-                 con_lines: List[ConstellationLines],
-                 milky_way: MilkyWay,
-                 dso_data: Dict[str, Dso], object_ids: List[str]):
-        self.width = width
-        self.height = height
-        self.surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, self.width, self.height)
-        self.stars = stars
-        self.con_lines = con_lines
-        self.milky_way = milky_way
-        self.dso_data = dso_data
-        self.object_ids = object_ids
+# candidate grid spacings, coarsest first
+RA_STEPS = [1.0, 0.5, 1.0 / 3, 1.0 / 6, 1.0 / 12, 1.0 / 30, 1.0 / 60]
+DEC_STEPS = [10.0, 5.0, 2.0, 1.0, 0.5, 1.0 / 3, 1.0 / 6, 1.0 / 12]
 
-        margin = 15
-        self.frame = Frame(2 * margin, margin, self.width - 3 * margin, self.height - 3 * margin)
 
-    def draw_globular_cluster(self, ctx):
-        r = 10.0
-        ctx.set_source_rgb(1.0, 1.0, 0.0)
-        ctx.arc(0, 0, r, 0.0, 2 * math.pi)
-        ctx.fill()
+def pick_step(span: float, steps: List[float]) -> float:
+    """Picks the coarsest step that still gives a few grid lines over the span."""
+    for step in steps:
+        if span / step >= 4:
+            return step
+    return steps[-1]
 
-        ctx.set_source_rgb(0.0, 0.0, 0.0)
-        ctx.arc(0, 0, r, 0.0, 2 * math.pi)
-        ctx.move_to(-r, 0)
-        ctx.line_to(r, 0)
-        ctx.move_to(0, -r)
-        ctx.line_to(0, r)
-        ctx.stroke()
 
-    def draw_open_cluster(self, ctx):
-        r = 10.0
-        ctx.set_source_rgb(1.0, 1.0, 0.0)
-        ctx.arc(0, 0, r, 0.0, 2 * math.pi)
-        ctx.fill()
+def ticks(lo: float, hi: float, step: float) -> List[float]:
+    first = math.ceil(lo / step - 1e-9)
+    last = math.floor(hi / step + 1e-9)
+    return [k * step for k in range(first, last + 1)]
 
-        ctx.set_line_cap(cairo.LINE_CAP_ROUND)
-        ctx.set_source_rgb(0.0, 0.0, 0.0)
-        ctx.set_dash([0.0, 7.0])
-        ctx.set_line_width(3)
-        ctx.arc(0, 0, r, 0.0, 2 * math.pi)
-        ctx.stroke()
 
-    def draw_bright_nebula(self, ctx):
-        r = 10.0
-        ctx.set_source_rgb(0.0, 1.0, 0.0)
-        ctx.rectangle(-r, -r, 2 * r, 2 * r)
-        ctx.fill()
-        ctx.set_source_rgb(0.0, 0.0, 0.0)
-        ctx.rectangle(-r, -r, 2 * r, 2 * r)
-        ctx.stroke()
+@dataclass(frozen=True)
+class Region:
+    """A regional finder chart: center ra (hours) and dec (degrees), width of
+    the field of view (degrees), and the faintest star magnitude to plot."""
+    ra: float
+    dec: float
+    fov: float
+    mag_limit: float
 
-    def draw_asterism(self, ctx):
-        r = 10.0
-        ctx.set_source_rgb(0.0, 0.0, 0.0)
-        ctx.move_to(-r, -r)
-        ctx.line_to(r, r)
-        ctx.move_to(r, -r)
-        ctx.line_to(-r, r)
-        ctx.stroke()
+    def bounds(self, aspect: float) -> Bounds:
+        """Box covered by the chart, for a frame with the given height / width."""
+        half_dec = 0.5 * self.fov * aspect
+        dec_min = max(-90.0, self.dec - half_dec)
+        dec_max = min(90.0, self.dec + half_dec)
+        cos_dec = math.cos(math.radians(self.dec))
+        if cos_dec * 360.0 <= self.fov:
+            ra_span = 24.0
+        else:
+            ra_span = self.fov / 15.0 / cos_dec
+        return Bounds(self.ra - 0.5 * ra_span, self.ra + 0.5 * ra_span, dec_min, dec_max)
 
-    def ellipse_path(self, ctx):
-        r = 10
-        ctx.save()
-        ctx.scale(1, 0.5)
-        ctx.arc(0, 0, r, 0.0, 2 * math.pi)
-        ctx.restore()
 
-    def draw_galaxy(self, ctx):
-        self.ellipse_path(ctx)
-        ctx.set_source_rgb(1.0, 0.0, 0.0)
-        ctx.fill()
-        self.ellipse_path(ctx)
-        ctx.set_source_rgb(0.0, 0.0, 0.0)
-        ctx.stroke()
-
-    def draw_planetary_nebula(self, ctx):
-        r = 10.0
-        green_r = 0.8 * r  # radius of the green dot
-        line_r = 1.2 * r  # radius of the crossing lines
-
-        ctx.set_source_rgb(0.0, 0.0, 0.0)
-        ctx.move_to(-line_r, 0)
-        ctx.line_to(line_r, 0)
-        ctx.move_to(0, -line_r)
-        ctx.line_to(0, line_r)
-        ctx.stroke()
+class Frame:
+    """Represents a plot of the sky in the designated rectangle.
 
-        ctx.set_source_rgb(0.0, 1.0, 0.0)
-        ctx.arc(0, 0, green_r, 0.0, 2 * math.pi)
-        ctx.fill()
+    By default the whole sky is shown; otherwise only the given bounds,
+    whose ra_min may be negative for a region crossing 0h.
+    """
 
-        ctx.set_source_rgb(0.0, 0.0, 0.0)
-        ctx.arc(0, 0, green_r, 0.0, 2 * math.pi)
-        ctx.stroke()
+    def __init__(self, left: float, top: float, width: float, height: float,
+                 bounds: Bounds = FULL_SKY):
+        self.left = left
+        self.top = top
+        self.width = width
+        self.height = height
+        self.right = self.left + width
+        self.bottom = self.top + height
+        self.bounds = bounds
+        self.whole_sky = (bounds == FULL_SKY)
+        self.ra_step = pick_step(bounds.ra_max - bounds.ra_min, RA_STEPS)
+        self.dec_step = pick_step(bounds.dec_max - bounds.dec_min, DEC_STEPS)
 
-    def draw_carbon_star(self, ctx):
-        r = 10.0
+    def ra_to_x(self, ra: float) -> float:
+        b = self.bounds
+        return self.left + self.width * (b.ra_max - ra) / (b.ra_max - b.ra_min)
 
-        ctx.set_source_rgb(1.0, 0.5, 0.0)
-        ctx.move_to(-r, 0)
-        ctx.line_to(0, -r)
-        ctx.line_to(r, 0)
-        ctx.line_to(0, r)
-        ctx.close_path()
-        ctx.fill()
+    def dec_to_y(self, dec: float) -> float:
+        b = self.bounds
+        return self.top + self.height * (b.dec_max - dec) / (b.dec_max - b.dec_min)
+
+    def wrap_ra(self, ra: float) -> float:
+        """Shifts points by a multiple of 24h into the frame's ra range."""
+        if self.whole_sky:
+            return ra
+        return (ra - self.bounds.ra_min) % 24.0 + self.bounds.ra_min
+
+    def contains(self, ra: float, dec: float) -> bool:
+        b = self.bounds
+        ra = self.wrap_ra(ra)
+        return b.ra_min <= ra <= b.ra_max and b.dec_min <= dec <= b.dec_max
+
+    def ra_offsets(self, bounds: Bounds) -> List[float]:
+        """Shifts (multiples of 24h) at which geometry within the given
+        bounds, which must not cross 0h, is visible in the frame."""
+        if self.whole_sky:
+            return [0.0]
+        b = self.bounds
+        if bounds.dec_max < b.dec_min or bounds.dec_min > b.dec_max:
+            return []
+        return [shift for shift in (-24.0, 0.0, 24.0)
+                if bounds.ra_max + shift >= b.ra_min and bounds.ra_min + shift <= b.ra_max]
+
+    def deg_per_pixel(self) -> float:
+        """Finest scale, along either axis, of the frame in degrees per pixel."""
+        b = self.bounds
+        return min(15.0 * (b.ra_max - b.ra_min) / self.width,
+                   (b.dec_max - b.dec_min) / self.height)
+
+    def ra_ticks(self) -> List[float]:
+        return ticks(self.bounds.ra_min, self.bounds.ra_max, self.ra_step)
+
+    def dec_ticks(self) -> List[float]:
+        return ticks(self.bounds.dec_min, self.bounds.dec_max, self.dec_step)
+
+    def ra_label(self, ra: float) -> str:
+        if self.whole_sky:
+            return str(int(round(ra)))
+        minutes = int(round((ra % 24.0) * 60.0)) % (24 * 60)
+        return "{}h{:02d}m".format(minutes // 60, minutes % 60)
+
+    def dec_label(self, dec: float) -> str:
+        if self.dec_step >= 1.0:
+            return str(int(round(dec)))
+        minutes = int(round(abs(dec) * 60.0))
+        sign = '-' if dec < 0 else ''
+        return "{}{}\u00b0{:02d}'".format(sign, minutes // 60, minutes % 60)
 
-        ctx.set_source_rgb(0.0, 0.0, 0.0)
-        ctx.move_to(-r, 0)
-        ctx.line_to(0, -r)
-        ctx.line_to(r, 0)
-        ctx.line_to(0, r)
-        ctx.close_path()
-        ctx.stroke()
 
+class StarPlot:
 
-    def draw_double(self, ctx):
-        r = 10.0
-        dot_r = 0.6 * r  # radius of the dot
-        line_r = 1.2 * r  # radius of the crossing line
+    def __init__(self, width: int, height: int, sky: SkyData,
+                 object_ids: List[str], region: Optional[Region] = None,
+                 background: Optional["BackgroundCache"] = None,
+                 glyphs: Optional[GlyphCache] = None,
+                 profile: Optional[RenderProfile] = None):
+        self.width = width
+        self.height = height
+        self.sky = sky
+        self.milky_way = sky.milky_way
+        self.dso_data = sky.dso_data
+        self.object_ids = object_ids
+        self.region = region
+        self.background = background
+        self.glyphs = glyphs if glyphs is not None else GlyphCache()
+        self.profile = profile
 
+        margin = 15
+        if region is None:
+            self.frame = Frame(2 * margin, margin, self.width - 3 * margin, self.height - 3 * margin)
+            self.visible_stars = sky.stars
+            self.star_mag_limit = DEFAULT_MAG_LIMIT
+        else:
+            # regional labels like -41°30' need more room on the left
+            frame_width = self.width - 5 * margin
+            frame_height = self.height - 3 * margin
+            bounds = region.bounds(frame_height / frame_width)
+            self.frame = Frame(4 * margin, margin, frame_width, frame_height, bounds)
+            with self.timed("cull_stars"):
+                self.visible_stars = sky.star_grid.stars_in(bounds.ra_min, bounds.ra_max,
+                                                            bounds.dec_min, bounds.dec_max,
+                                                            region.mag_limit)
+            # give stars at the limiting magnitude a small dot
+            self.star_mag_limit = region.mag_limit + 1.0
+
+    @contextmanager
+    def timed(self, name: str, ctx=None):
+        """Profiles the block as the layer name, if profiling.  Yields the
+        context to draw the layer with."""
+        if self.profile is None:
+            yield ctx
+        else:
+            with self.profile.layer(name, ctx) as counted:
+                yield counted
+
+    def draw_layer(self, draw, ctx, *args):
+        with self.timed(draw.__name__, ctx) as layer_ctx:
+            draw(layer_ctx, *args)
+
+    def draw_dsos(self, ctx, kind: str = "vector"):
         ctx.save()
-
-        ctx.set_source_rgb(0.0, 0.0, 0.0)
-        ctx.move_to(-line_r, 0)
-        ctx.line_to(line_r, 0)
-        ctx.stroke()
-
-        ctx.set_source_rgb(1.0, 0.0, 1.0)
-        ctx.arc(0, 0, dot_r, 0.0, 2 * math.pi)
-        ctx.fill()
-
-        ctx.set_source_rgb(0.0, 0.0, 0.0)
-        ctx.arc(0, 0, dot_r, 0.0, 2 * math.pi)
-        ctx.stroke()
-        ctx.restore()
-
-    def draw_dsos(self, ctx):
+        # don't depend on what the layers before left set
+        set_symbol_stroke(ctx)
         for dso_id in self.object_ids:
             if dso_id not in self.dso_data:
                 print("warning: couldn't plot " + dso_id)
                 continue
             dso = self.dso_data[dso_id]
-            x = self.frame.ra_to_x(dso.loc.ra)
+            if not self.frame.contains(dso.loc.ra, dso.loc.dec):
+                continue
+            x = self.frame.ra_to_x(self.frame.wrap_ra(dso.loc.ra))
             y = self.frame.dec_to_y(dso.loc.dec)
-            ctx.save()
-            ctx.translate(x, y)
-            ctx.scale(0.4, 0.4)
-            if dso.dsoType == DsoType.GALAXY:
-                self.draw_galaxy(ctx)
-            elif dso.dsoType == DsoType.OPEN_CLUSTER:
-                self.draw_open_cluster(ctx)
-            elif dso.dsoType == DsoType.GLOBULAR_CLUSTER:
-                self.draw_globular_cluster(ctx)
-            elif dso.dsoType == DsoType.BRIGHT_NEBULA:
-                self.draw_bright_nebula(ctx)
-            elif dso.dsoType == DsoType.PLANETARY_NEBULA:
-                self.draw_planetary_nebula(ctx)
-            elif dso.dsoType == DsoType.ASTERISM:
-                self.draw_asterism(ctx)
-            elif dso.dsoType == DsoType.DOUBLE:
-                self.draw_double(ctx)
-            elif dso.dsoType == DsoType.CARBON:
-                self.draw_carbon_star(ctx)
-            ctx.restore()
-
-    def draw_con_lines(self, ctx):
-        con_polys = to_simple_polys(self.con_lines, self.stars)
+            if dso.dsoType not in GLYPHS:
+                print("warning: no symbol for type of " + dso_id)
+                continue
+            self.glyphs.stamp(ctx, dso.dsoType, x, y, DSO_SCALE, kind)
+        ctx.restore()
 
-        ctx.save()
-        ctx.set_source_rgb(0.5, 0.0, 0.0)
-        ctx.set_line_width(0.5)
-        # ctx.set_source_rgb(0.8, 0.8, 0.8)
-        for p in con_polys:
+    def poly_path(self, ctx, p: Poly) -> bool:
+        """Adds the polygon to the path, once for each place it shows in the
+        frame.  Returns False if it is not visible at all."""
+        shifts = self.frame.ra_offsets(p.bounds())
+        for shift in shifts:
             for idx, v in enumerate(p.v):
-                x = self.frame.ra_to_x(v.ra)
+                x = self.frame.ra_to_x(v.ra + shift)
                 y = self.frame.dec_to_y(v.dec)
                 if idx == 0:
                     ctx.move_to(x, y)
                 else:
                     ctx.line_to(x, y)
-            ctx.stroke()
+        return len(shifts) > 0
+
+    def draw_con_lines(self, ctx):
+        ctx.save()
+        ctx.set_source_rgb(0.5, 0.0, 0.0)
+        ctx.set_line_width(0.5)
+        # ctx.set_source_rgb(0.8, 0.8, 0.8)
+        for p in self.sky.con_polys:
+            if self.poly_path(ctx, p):
+                ctx.stroke()
         ctx.restore()
 
     def draw_milky_way(self, ctx):
@@ -228,34 +260,37 @@ class StarPlot:
         ctx.set_fill_rule(cairo.FILL_RULE_EVEN_ODD)
         start_color = (0.73, 0.83, 1.0)
         end_color = (0.875, 0.94, 1.0)
-        num_layers = len(self.milky_way.layers)
-        for idx, layer in enumerate(self.milky_way.layers):
+        # small charts can use simplified outlines
+        layers = self.milky_way.layers_for(self.frame.deg_per_pixel())
+        num_layers = len(layers)
+        for idx, layer in enumerate(layers):
             lam = float(idx) / (num_layers - 1.0)
             r = lam * start_color[0] + (1 - lam) * end_color[0]
             g = lam * start_color[1] + (1 - lam) * end_color[1]
             b = lam * start_color[2] + (1 - lam) * end_color[2]
             ctx.set_source_rgb(r, g, b)
             for p in layer.polys:
-                for idx, v in enumerate(p.v):
-                    x = self.frame.ra_to_x(v.ra)
-                    y = self.frame.dec_to_y(v.dec)
-                    if idx == 0:
-                        ctx.move_to(x, y)
-                    else:
-                        ctx.line_to(x, y)
+                self.poly_path(ctx, p)
             ctx.fill()
         ctx.restore()
 
+    def star_circles(self):
+        """Projects all stars at once; returns x, y, radius of the visible ones."""
+        stars = self.visible_stars
+        radius = star_radius(stars.mag, self.star_mag_limit)
+        visible = radius > 0
+        x = self.frame.ra_to_x(self.frame.wrap_ra(stars.ra[visible]))
+        y = self.frame.dec_to_y(stars.dec[visible])
+        return x, y, radius[visible]
+
     def draw_stars(self, ctx):
         ctx.set_source_rgb(0.0, 0.0, 0.0)
-        for star_id, s in self.stars.items():
-            x = self.frame.ra_to_x(s.loc.ra)
-            y = self.frame.dec_to_y(s.loc.dec)
-            radius = -0.55 * s.mag + 3.5
-            # radius = 0.09 * s.mag * s.mag - 1.0 * s.mag + 3.4
-            if radius > 0:
-                ctx.arc(x, y, radius, 0.0, 2 * math.pi)
-                ctx.fill()
+        xs, ys, radii = self.star_circles()
+        # all circles go in one path so cairo only has to fill once
+        for x, y, r in zip(xs.tolist(), ys.tolist(), radii.tolist()):
+            ctx.new_sub_path()
+            ctx.arc(x, y, r, 0.0, 2 * math.pi)
+        ctx.fill()
 
     def draw_background(self, ctx):
         ctx.set_source_rgb(1.0, 1., 1.0)
@@ -266,7 +301,7 @@ class StarPlot:
         # hours
         ctx.set_line_width(1)
         ctx.set_source_rgb(0.8, 0.8, 0.8)
-        for ra in range(24):
+        for ra in self.frame.ra_ticks():
             x = self.frame.ra_to_x(ra)
             ymin = self.frame.top
             ymax = self.frame.bottom
@@ -277,7 +312,7 @@ class StarPlot:
         # dec lines
         ctx.set_line_width(1)
         ctx.set_source_rgb(0.8, 0.8, 0.8)
-        for dec in range(-90, 90, 10):
+        for dec in self.frame.dec_ticks():
             xmin = self.frame.left
             xmax = self.frame.right
             y = self.frame.dec_to_y(dec)
@@ -291,19 +326,22 @@ class StarPlot:
                              cairo.FONT_WEIGHT_NORMAL)
         ctx.set_font_size(10)
 
-        for ra in range(25):
+        for ra in self.frame.ra_ticks():
+            label = self.frame.ra_label(ra)
             x = self.frame.ra_to_x(ra)
             y = self.frame.bottom
-            (x_bearing, y_bearing, width, height, dx, dy) = ctx.text_extents(str(ra))
+            (x_bearing, y_bearing, width, height, dx, dy) = ctx.text_extents(label)
             ctx.move_to(x - width * 0.5, y + 1.5 * height)
-            ctx.show_text(str(ra))
+            ctx.show_text(label)
 
+        dec_labels = [(dec, self.frame.dec_label(dec)) for dec in self.frame.dec_ticks()]
         (x_bearing, y_bearing, width, height, dx, dy) = ctx.text_extents("-900")
-        for dec in range(-90, 100, 10):
+        width = max([width] + [ctx.text_extents(label)[2] for _, label in dec_labels])
+        for dec, label in dec_labels:
             x = self.frame.left
             y = self.frame.dec_to_y(dec)
             ctx.move_to(x - width, y + 0.5 * height)
-            ctx.show_text(str(dec))
+            ctx.show_text(label)
 
     def draw_frame(self, ctx):
         ctx.rectangle(self.frame.left, self.frame.top, self.frame.width, self.frame.height)
@@ -311,22 +349,101 @@ class StarPlot:
         ctx.set_source_rgb(0.0, 0.0, 0.0)
         ctx.stroke()
 
-    def draw(self, ctx):
-        self.draw_background(ctx)
-        self.draw_milky_way(ctx)
-        self.draw_grid(ctx)
-        self.draw_labels(ctx)
-        self.draw_con_lines(ctx)
-        self.draw_stars(ctx)
-        self.draw_dsos(ctx)
-        self.draw_frame(ctx)
-
-    def write_png(self, filename: str):
-        ctx = cairo.Context(self.surface)
-        self.draw(ctx)
-        self.surface.write_to_png(filename)
+    def clip_to_frame(self, ctx):
+        ctx.rectangle(self.frame.left, self.frame.top, self.frame.width, self.frame.height)
+        ctx.clip()
+
+    def draw_static(self, ctx):
+        """Draws everything that does not depend on the object list."""
+        self.draw_layer(self.draw_background, ctx)
+        ctx.save()
+        if self.region is not None:
+            self.clip_to_frame(ctx)
+        self.draw_layer(self.draw_milky_way, ctx)
+        self.draw_layer(self.draw_grid, ctx)
+        self.draw_layer(self.draw_con_lines, ctx)
+        self.draw_layer(self.draw_stars, ctx)
+        ctx.restore()
+        self.draw_layer(self.draw_labels, ctx)
+
+    def draw_overlay(self, ctx, kind: str = "vector"):
+        ctx.save()
+        if self.region is not None:
+            self.clip_to_frame(ctx)
+        self.draw_layer(self.draw_dsos, ctx, kind)
+        ctx.restore()
+        self.draw_layer(self.draw_frame, ctx)
+
+    def draw(self, ctx, kind: str = "vector"):
+        """Draws the chart; kind is "raster" or "vector", for the cached background."""
+        if self.background is None:
+            self.draw_static(ctx)
+        else:
+            surface = self.background.get(self, kind)
+            with self.timed("paint_background", ctx) as layer_ctx:
+                layer_ctx.save()
+                layer_ctx.set_source_surface(surface, 0, 0)
+                layer_ctx.paint()
+                layer_ctx.restore()
+        self.draw_overlay(ctx, kind)
+
+    def write_outputs(self, outputs: List[OutputSpec]):
+        """Writes the chart to each output (see chart_outputs.py), drawing it once."""
+        write_outputs(self.draw, self.width, self.height, outputs)
+
+    def write_png(self, filename: str, scale: float = 1.0):
+        self.write_outputs([OutputSpec(filename, "png", scale)])
 
     def write_pdf(self, filename: str):
-        ps = cairo.PDFSurface(filename, self.width, self.height)
-        ctx = cairo.Context(ps)
-        self.draw(ctx)
+        self.write_outputs([OutputSpec(filename, "pdf")])
+
+
+class BackgroundCache:
+    """Keeps the static layers of charts so they are drawn only once.
+
+    Charts with the same size, region and catalogs share a background:
+    an image for raster output, or a recording surface for vector output so
+    PDFs stay resolution independent.  Each chart then only draws its DSOs
+    on top.  If cache_dir is given, raster backgrounds are also saved there
+    as PNGs and reused by later runs.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = cache_dir
+        self.surfaces = {}
+
+    def key(self, plot: StarPlot, kind: str):
+        return (plot.width, plot.height, kind, plot.region, plot.sky.version)
+
+    def cache_file(self, key) -> Optional[str]:
+        if self.cache_dir is None or not key[-1]:
+            # no way to tell if the catalogs changed; don't keep on disk
+            return None
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, "background-" + digest + ".png")
+
+    def render(self, plot: StarPlot, kind: str):
+        if kind == "raster":
+            surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, plot.width, plot.height)
+        else:
+            surface = cairo.RecordingSurface(cairo.CONTENT_COLOR_ALPHA,
+                                             cairo.Rectangle(0, 0, plot.width, plot.height))
+        plot.draw_static(cairo.Context(surface))
+        return surface
+
+    def get(self, plot: StarPlot, kind: str):
+        key = self.key(plot, kind)
+        if key in self.surfaces:
+            return self.surfaces[key]
+
+        png_file = self.cache_file(key) if kind == "raster" else None
+        if png_file is not None and os.path.exists(png_file):
+            surface = cairo.ImageSurface.create_from_png(png_file)
+        else:
+            surface = self.render(plot, kind)
+            if png_file is not None:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                surface.write_to_png(png_file + ".tmp")
+                os.replace(png_file + ".tmp", png_file)
+        self.surfaces[key] = surface
+        return surface
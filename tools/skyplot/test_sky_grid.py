@@ -0,0 +1,42 @@
+"""Tests of StarGrid.query against a scan of every star."""
+import numpy as np
+
+from sky_grid import StarGrid
+from star import StarCatalog
+
+
+def random_catalog(n: int, seed: int = 1) -> StarCatalog:
+    rng = np.random.default_rng(seed)
+    return StarCatalog(np.arange(1, n + 1), rng.uniform(0.0, 24.0, n),
+                       np.degrees(np.arcsin(rng.uniform(-1.0, 1.0, n))), rng.uniform(-1.0, 9.0, n))
+
+
+def scan(stars: StarCatalog, ra_min: float, ra_max: float, dec_min: float, dec_max: float,
+         mag_limit: float) -> np.ndarray:
+    inside = (stars.dec >= dec_min) & (stars.dec <= dec_max) & (stars.mag <= mag_limit)
+    if ra_max - ra_min < 24.0:
+        inside &= (stars.ra - ra_min) % 24.0 + ra_min <= ra_max
+    return np.nonzero(inside)[0]
+
+
+def test_query_matches_scan():
+    stars = random_catalog(5000)
+    grid = StarGrid(stars)
+    rng = np.random.default_rng(2)
+    for _ in range(200):
+        ra_min = rng.uniform(-4.0, 24.0)
+        ra_max = ra_min + rng.uniform(0.0, 24.0)
+        dec_min = rng.uniform(-90.0, 90.0)
+        dec_max = rng.uniform(dec_min, 90.0)
+        window = (ra_min, ra_max, dec_min, dec_max, 6.0)
+        assert np.array_equal(grid.query(*window), scan(stars, *window))
+
+
+def test_query_just_under_24h_returns_each_star_once():
+    stars = random_catalog(5000)
+    grid = StarGrid(stars)
+    for (ra_min, ra_max) in [(-0.05, 23.9), (0.01, 24.0), (-1.0, 22.95), (3.3, 27.2)]:
+        window = (ra_min, ra_max, 60.0, 90.0, 9.0)
+        idx = grid.query(*window)
+        assert len(np.unique(idx)) == len(idx)
+        assert np.array_equal(idx, scan(stars, *window))
@@ -0,0 +1,260 @@
+"""
+Draws the sky as a pyramid of PNG tiles, for a zoomable map.
+
+The sky is mapped like the full sky chart (RA increasing to the left, from
+24h at the left edge, Dec 90 at the top).  At zoom level z it is cut into
+2^(z+1) x 2^z square tiles, each 180 / 2^z degrees across, written to
+<output>/z/x/y.png with x counted from the left and y from the top.  Each
+tile shows the milky way, the grid, constellation lines, stars (fainter
+ones at deeper zooms) and objects.
+
+Usage, for zoom levels 0 to 5 using every core:
+python3 tile_renderer.py -o tiles -z 5
+
+or only the objects in a list:
+python3 tile_renderer.py -o tiles -z 5 -i data/H400.tsv
+
+Stars and objects are culled to each tile (plus a margin, so symbols on a
+tile's edge are drawn whole on both sides).  A hash of each tile's inputs is
+kept in <output>/manifest.json, and tiles whose inputs have not changed
+since are not drawn again; --force draws them all.
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from dataclasses import dataclass
+from optparse import OptionParser
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from dso import read_object_list
+from dso_glyphs import GlyphCache
+from file_cache import content_hash
+from file_cache import write_atomic
+from geometry import Bounds
+from sky_data import DATA_DIR
+from sky_data import OBJECTS_FILE
+from sky_data import SkyData
+from sky_data import load_sky_data
+from star_chart import Frame
+from star_chart import StarPlot
+
+# the sky index is shared with the other tools one directory up
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from spatial_index import SkyIndex
+
+# Bump when tiles are drawn differently, so they are all drawn again.
+TILE_RENDERER_VERSION = 1
+
+# margin, in pixels, around a tile within which stars and objects are drawn
+PAD_PIXELS = 12
+
+# faintest stars shown at zoom level 0; each level shows a magnitude more
+BASE_MAG_LIMIT = 4.5
+
+
+@dataclass(frozen=True)
+class Tile:
+    z: int
+    x: int
+    y: int
+
+    @property
+    def name(self) -> str:
+        return "{}/{}/{}".format(self.z, self.x, self.y)
+
+    def degrees(self) -> float:
+        return 180.0 / 2 ** self.z
+
+    def bounds(self, pad: float = 0.0) -> Bounds:
+        """The sky covered by the tile, widened by pad degrees on each side.
+        ra_min may be negative, or ra_max above 24, at the edges."""
+        size = self.degrees()
+        ra_max = 24.0 - self.x * size / 15.0 + pad / 15.0
+        ra_min = 24.0 - (self.x + 1) * size / 15.0 - pad / 15.0
+        dec_max = 90.0 - self.y * size + pad
+        dec_min = 90.0 - (self.y + 1) * size - pad
+        return Bounds(ra_min, ra_max, dec_min, dec_max)
+
+    def mag_limit(self) -> float:
+        return BASE_MAG_LIMIT + self.z
+
+    def padded_bounds(self, tile_size: int) -> Bounds:
+        return self.bounds(PAD_PIXELS * self.degrees() / tile_size)
+
+
+def tiles_at(z: int) -> List[Tile]:
+    return [Tile(z, x, y) for x in range(2 ** (z + 1)) for y in range(2 ** z)]
+
+
+class TilePlot(StarPlot):
+    """A StarPlot of one tile: no labels or frame, and the frame's bounds
+    stretched past the image by PAD_PIXELS, so geometry near the edges is
+    drawn the same as on the neighbouring tiles."""
+
+    def __init__(self, tile: Tile, tile_size: int, sky: SkyData, object_ids: List[str],
+                 glyphs: Optional[GlyphCache] = None):
+        super().__init__(tile_size, tile_size, sky, object_ids, glyphs=glyphs)
+        bounds = tile.padded_bounds(tile_size)
+        self.frame = Frame(-PAD_PIXELS, -PAD_PIXELS, tile_size + 2 * PAD_PIXELS,
+                           tile_size + 2 * PAD_PIXELS, bounds)
+        self.visible_stars = sky.star_grid.stars_in(bounds.ra_min, bounds.ra_max,
+                                                    bounds.dec_min, bounds.dec_max,
+                                                    tile.mag_limit())
+        # give stars at the limiting magnitude a small dot
+        self.star_mag_limit = tile.mag_limit() + 1.0
+
+    def draw(self, ctx, kind: str = "raster"):
+        self.draw_layer(self.draw_background, ctx)
+        self.draw_layer(self.draw_milky_way, ctx)
+        self.draw_layer(self.draw_grid, ctx)
+        self.draw_layer(self.draw_con_lines, ctx)
+        self.draw_layer(self.draw_stars, ctx)
+        self.draw_layer(self.draw_dsos, ctx, kind)
+
+
+class TileInputs:
+    """Finds what each tile shows, and hashes it to tell if a tile changed."""
+
+    def __init__(self, sky: SkyData, object_ids: List[str], tile_size: int, data_dir: str):
+        self.sky = sky
+        self.tile_size = tile_size
+        self.object_ids = [i for i in object_ids if i in sky.dso_data]
+        self.dso_index = SkyIndex(np.array([sky.dso_data[i].loc.ra for i in self.object_ids]),
+                                  np.array([sky.dso_data[i].loc.dec for i in self.object_ids]))
+        # the constellation lines and milky way are not culled; a change
+        # to either redraws every tile
+        common = hashlib.sha1()
+        common.update("{} {} {}".format(TILE_RENDERER_VERSION, tile_size, PAD_PIXELS).encode('utf-8'))
+        for f in ["constellation_lines.tsv", "milkyway.json"]:
+            common.update(content_hash(os.path.join(data_dir, f)).encode('utf-8'))
+        self.common = common.digest()
+
+    def object_ids_in(self, tile: Tile) -> List[str]:
+        b = tile.padded_bounds(self.tile_size)
+        if b.ra_max - b.ra_min >= 24.0:
+            idx = self.dso_index.window(0.0, 24.0, b.dec_min, b.dec_max)
+        else:
+            idx = self.dso_index.window(b.ra_min % 24.0, b.ra_max % 24.0, b.dec_min, b.dec_max)
+        return [self.object_ids[i] for i in idx]
+
+    def input_hash(self, tile: Tile, object_ids: List[str]) -> str:
+        b = tile.padded_bounds(self.tile_size)
+        stars = self.sky.star_grid.stars_in(b.ra_min, b.ra_max, b.dec_min, b.dec_max,
+                                            tile.mag_limit())
+        h = hashlib.sha1(self.common)
+        for column in [stars.ids, stars.ra, stars.dec, stars.mag]:
+            h.update(np.ascontiguousarray(column).tobytes())
+        for obj_id in object_ids:
+            dso = self.sky.dso_data[obj_id]
+            h.update("{}\t{}\t{!r}\t{!r}\n".format(obj_id, dso.dsoType.name,
+                                                   dso.loc.ra, dso.loc.dec).encode('utf-8'))
+        return h.hexdigest()
+
+
+def tile_file(output_dir: str, tile: Tile) -> str:
+    return os.path.join(output_dir, str(tile.z), str(tile.x), str(tile.y) + ".png")
+
+
+def read_manifest(manifest_file: str) -> Dict[str, str]:
+    try:
+        with open(manifest_file, 'r') as mfile:
+            return json.load(mfile)
+    except (OSError, ValueError):
+        return {}
+
+
+# Each worker process loads the catalogs once, in init_worker.
+_worker_sky: Optional[SkyData] = None
+_worker_glyphs: Optional[GlyphCache] = None
+
+
+def init_worker(data_dir: str, objects_file: str) -> None:
+    global _worker_sky, _worker_glyphs
+    _worker_sky = load_sky_data(data_dir, objects_file)
+    _worker_glyphs = GlyphCache()
+
+
+def render_tile(job: Tuple[Tile, int, List[str], str]) -> Tile:
+    (tile, tile_size, object_ids, output_file) = job
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    plot = TilePlot(tile, tile_size, _worker_sky, object_ids, _worker_glyphs)
+    plot.write_png(output_file + ".tmp")
+    os.replace(output_file + ".tmp", output_file)
+    return tile
+
+
+def render_tiles(output_dir: str, max_zoom: int, min_zoom: int = 0, tile_size: int = 256,
+                 object_file: Optional[str] = None, data_dir: str = DATA_DIR,
+                 objects_file: str = OBJECTS_FILE, processes: Optional[int] = None,
+                 force: bool = False) -> int:
+    """Draws the tiles of zoom levels min_zoom to max_zoom that changed.
+    Returns the number of tiles drawn."""
+    sky = load_sky_data(data_dir, objects_file)
+    object_ids = read_object_list(object_file) if object_file else list(sky.dso_data)
+    for obj_id in object_ids:
+        if obj_id not in sky.dso_data:
+            print("warning: couldn't plot " + obj_id)
+    inputs = TileInputs(sky, object_ids, tile_size, data_dir)
+
+    manifest_file = os.path.join(output_dir, "manifest.json")
+    # loaded even with force, to keep the hashes of the zoom levels not drawn
+    manifest = read_manifest(manifest_file)
+    jobs = []
+    hashes = {}
+    num_tiles = 0
+    for z in range(min_zoom, max_zoom + 1):
+        for tile in tiles_at(z):
+            num_tiles += 1
+            tile_ids = inputs.object_ids_in(tile)
+            hashes[tile.name] = inputs.input_hash(tile, tile_ids)
+            output_file = tile_file(output_dir, tile)
+            if (force or manifest.get(tile.name) != hashes[tile.name]
+                    or not os.path.exists(output_file)):
+                jobs.append((tile, tile_size, tile_ids, output_file))
+    print("{} of {} tiles to draw".format(len(jobs), num_tiles))
+
+    start = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    try:
+        if jobs:
+            with multiprocessing.Pool(processes, init_worker, (data_dir, objects_file)) as pool:
+                for tile in pool.imap_unordered(render_tile, jobs, chunksize=8):
+                    manifest[tile.name] = hashes[tile.name]
+    finally:
+        # keep the tiles drawn so far, even if interrupted
+        write_atomic(manifest_file, json.dumps(manifest, indent=0, sort_keys=True).encode('utf-8'))
+    if jobs:
+        print("drew {} tiles in {:.1f}s".format(len(jobs), time.perf_counter() - start))
+    return len(jobs)
+
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option("-o", "--output_dir", dest="output_dir",
+                      help="directory to write the tiles in", metavar="DIR")
+    parser.add_option("-z", "--max_zoom", dest="max_zoom", type="int", default=4,
+                      help="deepest zoom level to draw")
+    parser.add_option("--min_zoom", dest="min_zoom", type="int", default=0,
+                      help="first zoom level to draw")
+    parser.add_option("--tile_size", dest="tile_size", type="int", default=256,
+                      help="width and height of the tiles, in pixels")
+    parser.add_option("-i", "--object_ids", dest="object_ids",
+                      help="list of object ids to plot (default: all objects)", metavar="FILE")
+    parser.add_option("-p", "--processes", dest="processes", type="int",
+                      help="number of tiles to draw at once (default: number of cores)")
+    parser.add_option("--force", dest="force", action="store_true", default=False,
+                      help="draw every tile, even if unchanged")
+    (options, args) = parser.parse_args()
+    if not options.output_dir:
+        parser.error("an output directory must be given.  Run with -h to see usage.")
+    if options.min_zoom < 0 or options.min_zoom > options.max_zoom:
+        parser.error("zoom levels must satisfy 0 <= --min_zoom <= --max_zoom.")
+
+    render_tiles(options.output_dir, options.max_zoom, options.min_zoom, options.tile_size,
+                 options.object_ids, processes=options.processes, force=options.force)
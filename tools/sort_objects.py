@@ -3,13 +3,32 @@ Sorts the objects in objects.tsv
 
 Usage:
 python3 sort_objects.py -i ../data/objects.tsv
+
+To sort the file in place (the sorted copy replaces it only once complete):
+python3 sort_objects.py -i ../data/objects.tsv -w
+
+Lines are written exactly as they are in the file: the header and any
+other '#' comment lines first, in their order, then the objects, sorted.
+Blank lines are dropped.
+
+At most --chunk_size rows are held in memory at once; larger files are
+sorted a chunk at a time into temporary files, which are then merged.
 """
-from collections import defaultdict
-from dataclasses import dataclass
-from optparse import OptionParser
-from typing import List, Tuple, Counter, DefaultDict
-import string
+import heapq
+import os
 import re
+import sys
+import tempfile
+from optparse import OptionParser
+from typing import Iterator, List, Optional, TextIO, Tuple
+
+from tsv_tables import OBJECTS
+from tsv_tables import ObjectRow
+from tsv_tables import column_indices
+from tsv_tables import parse_header
+from tsv_tables import split_fields
+
+KeyedLine = Tuple[str, str]
 
 
 def natural_sort_key(s, _nsre=re.compile('([0-9]+)')):
@@ -17,50 +36,149 @@ def natural_sort_key(s, _nsre=re.compile('([0-9]+)')):
             for text in _nsre.split(s)]
 
 
-class Object:
-    """Class for fields of an object."""
+def encode_natural_key(s: str) -> str:
+    """A string that sorts like natural_sort_key(s).
 
-    is_header: bool
-    obj_id: str
-    obj_type: str
-    line: str
+    Text parts are lowercased and numbers are written with their number of
+    digits first (so 9 < 10), each part ending with '\x00' so that a
+    shorter part sorts before a longer one starting the same way.
+    """
+    parts = []
+    for part in natural_sort_key(s):
+        if isinstance(part, int):
+            digits = str(part)
+            part = "{:02d}{}".format(len(digits), digits)
+        parts.append(part)
+        parts.append('\x00')
+    return ''.join(parts)
 
-    def __init__(self, line: str):
-        fields: str = line.split('\t')
-        self.is_header = fields[0].startswith('#')
-        self.has_location = (fields[4] == '')
-        self.obj_id = fields[0]
-        self.obj_type = self.get_main_object_type(fields[2])
-        self.line = line
 
-    def get_main_object_type(self, obj_types) -> str:
-        types: str = obj_types.split('+')
-        return types[0]
+def get_main_object_type(obj_types: str) -> str:
+    return obj_types.split('+')[0]
 
 
-        
+def sort_key(row: ObjectRow) -> str:
+    """Objects without a location go last, then by type and by natural id order."""
+    has_location = '1' if row.ra == '' else '0'
+    return has_location + get_main_object_type(row.obj_type) + '\x00' + encode_natural_key(row.obj_id)
 
-def sort_objects(obj_file: str):
-    """Sort objects."""
-    ofile = open(obj_file, 'r')
-    lines = ofile.readlines()
-    objects = [Object(line) for line in lines]
-    sorted_objects = sorted(objects, key = lambda o: (not o.is_header, o.has_location, o.obj_type, natural_sort_key(o.obj_id)))
-    for o in sorted_objects:
-        print(o.line, end='')
-    #natsort_key1 = natsort_keygen(key=lambda y: y.lower())
-    #>>> l1.sort(key=natsort_key1)
 
+def write_chunk(chunk: List[KeyedLine], tmp_dir: str) -> str:
+    """Sorts the chunk and writes it to a temporary file. Returns its name."""
+    chunk.sort(key=lambda kl: kl[0])
+    fd, chunk_file = tempfile.mkstemp(suffix=".tsv", dir=tmp_dir)
+    with os.fdopen(fd, 'w') as cfile:
+        for key, line in chunk:
+            cfile.write(key + '\t' + line + '\n')
+    return chunk_file
 
-if __name__ == "__main__":
-    parser = OptionParser()
+
+def read_chunk(chunk_file: str) -> Iterator[KeyedLine]:
+    with open(chunk_file, 'r') as cfile:
+        for line in cfile:
+            key, _, row = line.rstrip('\n').partition('\t')
+            yield (key, row)
+
+
+def keyed_lines(obj_file: str, comments: List[str]) -> Iterator[KeyedLine]:
+    """Yields the sort key and the unchanged line (without its newline) of
+    each object, adding the header and other comment lines to comments."""
+    num_columns = len(OBJECTS.columns)
+    indices: Optional[List[int]] = None
+    with open(obj_file, 'r') as ofile:
+        for line in ofile:
+            line = line.rstrip('\n')
+            if line.startswith('#'):
+                if not comments:
+                    indices = column_indices(parse_header(line), OBJECTS)
+                comments.append(line)
+                continue
+            if not line.strip():
+                continue
+            row = ObjectRow._make(split_fields(line, indices, num_columns))
+            yield (sort_key(row), line)
+
+
+def sorted_lines(obj_file: str, chunk_size: int, tmp_dir: str) -> Iterator[str]:
+    """Yields the comment lines, then the lines of the objects in sorted
+    order, keeping at most chunk_size objects in memory."""
+    comments: List[str] = []
+    chunk: List[KeyedLine] = []
+    chunk_files: List[str] = []
+    try:
+        for keyed_line in keyed_lines(obj_file, comments):
+            chunk.append(keyed_line)
+            if len(chunk) >= chunk_size:
+                chunk_files.append(write_chunk(chunk, tmp_dir))
+                chunk = []
+        yield from comments
+
+        if not chunk_files:
+            # everything fit in memory
+            chunk.sort(key=lambda kl: kl[0])
+            for _, line in chunk:
+                yield line
+            return
+
+        if chunk:
+            chunk_files.append(write_chunk(chunk, tmp_dir))
+            chunk = []
+        # merge is stable, so equal keys keep their order in the input
+        for _, line in heapq.merge(*[read_chunk(f) for f in chunk_files], key=lambda kl: kl[0]):
+            yield line
+    finally:
+        for f in chunk_files:
+            os.remove(f)
+
+
+def write_sorted(obj_file: str, out: TextIO, chunk_size: int, tmp_dir: str) -> None:
+    for line in sorted_lines(obj_file, chunk_size, tmp_dir):
+        out.write(line + '\n')
+
+
+def sort_objects(obj_file: str, in_place: bool = False, chunk_size: int = 100000):
+    """Sort objects, printing them or, if in_place, rewriting obj_file."""
+    tmp_dir = os.path.dirname(os.path.abspath(obj_file))
+    if not in_place:
+        write_sorted(obj_file, sys.stdout, chunk_size, tmp_dir)
+        return
+
+    fd, tmp_file = tempfile.mkstemp(suffix=".tsv", dir=tmp_dir)
+    try:
+        with os.fdopen(fd, 'w') as out:
+            write_sorted(obj_file, out, chunk_size, tmp_dir)
+        os.replace(tmp_file, obj_file)
+    except BaseException:
+        os.remove(tmp_file)
+        raise
+
+
+def parse_options(argv: Optional[List[str]] = None, prog: Optional[str] = None):
+    """Parses (and checks) the command line options."""
+    parser = OptionParser(prog=prog)
     parser.add_option("-i", "--input",
                       dest="input_object_file",
                       help="file with objects",
                       metavar="TSV FILE")
-    (options, args) = parser.parse_args()
+    parser.add_option("-w", "--in_place",
+                      dest="in_place",
+                      action="store_true",
+                      default=False,
+                      help="replace the input file with the sorted objects")
+    parser.add_option("--chunk_size",
+                      dest="chunk_size",
+                      type="int",
+                      default=100000,
+                      help="most rows to sort in memory at once")
+    (options, args) = parser.parse_args(argv)
     if not (options.input_object_file):
         parser.error("must specify input object file.  Run with -h to see usage.")
+    return options
 
-    sort_objects(options.input_object_file)
 
+def main(options) -> None:
+    sort_objects(options.input_object_file, options.in_place, options.chunk_size)
+
+
+if __name__ == "__main__":
+    main(parse_options())
@@ -0,0 +1,202 @@
+r"""
+Finds objects near a position, or near each other, without comparing every pair.
+
+SkyIndex splits the sky into declination bands and sorts the objects in each
+band by RA, so the objects within some distance of a point are found with a
+binary search in the few bands the circle touches.  RA wraps around at 24h:
+a circle around 23h 59m also finds objects at 0h 01m.
+
+Finding all close pairs (e.g., M 31 and NGC 224 listed as separate objects)
+does one such search per object, all at once with numpy, so it takes
+O(n log n) time.
+
+Usage, to list likely duplicate objects (within 1 arcminute):
+python3 spatial_index.py -j ../data/objects.tsv -t 1
+
+or objects in one file that are also in another:
+python3 spatial_index.py -j ../data/objects.tsv -x new_objects.tsv -t 1
+"""
+import math
+from optparse import OptionParser
+from typing import List, Tuple
+
+import numpy as np
+
+from coords import parse_dec_column
+from coords import parse_ra_column
+from tsv_tables import read_objects
+
+# Each band's RA values are stored three times, shifted by -360, 0 and +360
+# degrees, in a band-sized slot of the sort key, so searches across 0h need
+# no special case.
+BAND_SLOT = 3 * 360.0
+
+Matches = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def separation(ra1, dec1, ra2, dec2):
+    """Angular distance in degrees between points given in hours and degrees."""
+    ra1 = np.radians(np.asarray(ra1, dtype=np.float64) * 15.0)
+    ra2 = np.radians(np.asarray(ra2, dtype=np.float64) * 15.0)
+    dec1 = np.radians(np.asarray(dec1, dtype=np.float64))
+    dec2 = np.radians(np.asarray(dec2, dtype=np.float64))
+    # haversine formula; accurate for small distances
+    a = (np.sin((dec2 - dec1) / 2.0) ** 2 +
+         np.cos(dec1) * np.cos(dec2) * np.sin((ra2 - ra1) / 2.0) ** 2)
+    return np.degrees(2.0 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0))))
+
+
+class SkyIndex:
+    """Positions (ra in hours, dec in degrees) indexed for nearby searches.
+
+    Results are indices into the arrays the index was built from.
+    """
+
+    def __init__(self, ra: np.ndarray, dec: np.ndarray, band_height: float = 1.0):
+        self.ra = np.asarray(ra, dtype=np.float64)
+        self.dec = np.asarray(dec, dtype=np.float64)
+        self.band_height = band_height
+        self.num_bands = int(math.ceil(180.0 / band_height))
+
+        ra_deg = np.mod(self.ra * 15.0, 360.0)
+        band = self.band_of(self.dec)
+        order = np.lexsort((ra_deg, band))
+        base = band[order] * BAND_SLOT + ra_deg[order]
+        keys = np.concatenate([base, base + 360.0, base + 720.0])
+        ext_order = np.argsort(keys, kind="stable")
+        self.keys = keys[ext_order]
+        self.key_index = np.tile(order, 3)[ext_order]
+
+    def __len__(self) -> int:
+        return len(self.ra)
+
+    def band_of(self, dec) -> np.ndarray:
+        band = np.floor((np.asarray(dec, dtype=np.float64) + 90.0) / self.band_height)
+        return np.clip(band, 0, self.num_bands - 1).astype(np.int64)
+
+    def ra_ranges(self, band, ra_lo, ra_hi) -> Tuple[np.ndarray, np.ndarray]:
+        """Positions in keys of the objects in band with ra_lo <= ra < ra_hi
+        (degrees, between -360 and 720)."""
+        start = np.searchsorted(self.keys, band * BAND_SLOT + ra_lo + 360.0, side='left')
+        end = np.searchsorted(self.keys, band * BAND_SLOT + ra_hi + 360.0, side='left')
+        return (start, end)
+
+    def match(self, ra, dec, radius: float) -> Matches:
+        """Finds every indexed object within radius degrees of each point.
+
+        Returns arrays (i, j, sep): point i is sep degrees from object j.
+        """
+        ra = np.atleast_1d(np.asarray(ra, dtype=np.float64))
+        dec = np.atleast_1d(np.asarray(dec, dtype=np.float64))
+        ra_deg = np.mod(ra * 15.0, 360.0)
+
+        # half width in RA of the circle, at the declination farthest from the equator
+        max_dec = np.minimum(np.abs(dec) + radius, 90.0)
+        cos_max = np.cos(np.radians(max_dec))
+        with np.errstate(divide='ignore'):
+            half_width = np.where(cos_max > 1e-9, radius / cos_max, 180.0)
+        half_width = np.minimum(half_width, 180.0)
+
+        lowest = self.band_of(dec - radius)
+        highest = self.band_of(dec + radius)
+        point_idx = []
+        positions = []
+        for offset in range(int((highest - lowest).max(initial=0)) + 1):
+            band = lowest + offset
+            points = np.nonzero(band <= highest)[0]
+            if len(points) == 0:
+                continue
+            (start, end) = self.ra_ranges(band[points],
+                                          ra_deg[points] - half_width[points],
+                                          ra_deg[points] + half_width[points])
+            counts = end - start
+            total = int(counts.sum())
+            if total == 0:
+                continue
+            # expand each (start, end) range into its positions
+            first = np.repeat(start - np.cumsum(counts) + counts, counts)
+            point_idx.append(np.repeat(points, counts))
+            positions.append(first + np.arange(total))
+
+        if not point_idx:
+            empty = np.zeros(0, dtype=np.int64)
+            return (empty, empty, np.zeros(0))
+        i = np.concatenate(point_idx)
+        j = self.key_index[np.concatenate(positions)]
+        sep = separation(ra[i], dec[i], self.ra[j], self.dec[j])
+        close = sep <= radius
+        return (i[close], j[close], sep[close])
+
+    def cone(self, ra: float, dec: float, radius: float) -> np.ndarray:
+        """Sorted indices of the objects within radius degrees of (ra, dec)."""
+        (_, j, _) = self.match(ra, dec, radius)
+        return np.sort(j)
+
+    def window(self, ra_min: float, ra_max: float, dec_min: float, dec_max: float) -> np.ndarray:
+        """Sorted indices of the objects with RA from ra_min to ra_max (hours,
+        crossing 0h if ra_min > ra_max) and Dec from dec_min to dec_max."""
+        lo = ra_min * 15.0
+        hi = ra_max * 15.0
+        if hi < lo:
+            hi += 360.0
+        pieces = []
+        for band in range(int(self.band_of(dec_min)), int(self.band_of(dec_max)) + 1):
+            (start, end) = self.ra_ranges(band, lo, np.nextafter(hi, np.inf))
+            pieces.append(self.key_index[start:end])
+        if not pieces:
+            return np.zeros(0, dtype=np.int64)
+        idx = np.concatenate(pieces)
+        idx = idx[(self.dec[idx] >= dec_min) & (self.dec[idx] <= dec_max)]
+        return np.unique(idx)
+
+    def self_match(self, radius: float) -> Matches:
+        """Finds every pair of indexed objects within radius degrees of each
+        other.  Returns arrays (i, j, sep) with i < j."""
+        (i, j, sep) = self.match(self.ra, self.dec, radius)
+        keep = i < j
+        return (i[keep], j[keep], sep[keep])
+
+
+def read_object_positions(obj_file: str) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """Reads the ids, ra and dec of the objects that have a position."""
+    rows = [row for row in read_objects(obj_file) if row.ra]
+    ra = parse_ra_column([row.ra for row in rows])
+    dec = parse_dec_column([row.dec for row in rows])
+    valid = ~(np.isnan(ra) | np.isnan(dec))
+    ids = [row.obj_id for row, ok in zip(rows, valid) if ok]
+    return (ids, ra[valid], dec[valid])
+
+
+def print_matches(ids1: List[str], ids2: List[str], matches: Matches) -> None:
+    (i, j, sep) = matches
+    for k in np.lexsort((j, i)):
+        print("{}\t{}\t{:.2f}'".format(ids1[i[k]], ids2[j[k]], sep[k] * 60.0))
+
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option("-j", "--object_file",
+                      dest="object_file",
+                      help="file with objects",
+                      metavar="TSV FILE")
+    parser.add_option("-x", "--cross_match_file",
+                      dest="cross_match_file",
+                      help="file with objects to find in the object file (optional)",
+                      metavar="TSV FILE")
+    parser.add_option("-t", "--tolerance",
+                      dest="tolerance",
+                      type="float",
+                      default=1.0,
+                      help="largest distance, in arcminutes, between matching objects")
+    (options, args) = parser.parse_args()
+    if not options.object_file:
+        parser.error("an object file must be given.  Run with -h to see usage.")
+
+    (ids, ra, dec) = read_object_positions(options.object_file)
+    index = SkyIndex(ra, dec)
+    radius = options.tolerance / 60.0
+    if options.cross_match_file:
+        (other_ids, other_ra, other_dec) = read_object_positions(options.cross_match_file)
+        print_matches(other_ids, ids, index.match(other_ra, other_dec, radius))
+    else:
+        print_matches(ids, ids, index.self_match(radius))
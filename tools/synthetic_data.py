@@ -0,0 +1,190 @@
+r"""
+Generates synthetic data files, a multiple of the size of the real ones, for benchmarks.
+
+The same scale and seed always give the same files.  The layout mirrors
+the repository's:
+    <out>/data/objects.tsv
+    <out>/data/observations.tsv
+    <out>/data/programs.tsv
+    <out>/skyplot/data/stars.tsv    the real stars, plus made up ones
+    <out>/skyplot/data/constellation_lines.tsv and milkyway.json (copied)
+
+Usage:
+python3 synthetic_data.py -s 10 -o /tmp/astrodb_x10
+"""
+import datetime
+import math
+import os
+import random
+import shutil
+from optparse import OptionParser
+from typing import List, Tuple
+
+from tsv_tables import OBJECTS
+from tsv_tables import OBSERVATIONS
+from tsv_tables import PROGRAMS
+from tsv_tables import format_header
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+REAL_SKY_DIR = os.path.join(TOOLS_DIR, "skyplot", "data")
+
+# Bump when the generated files change, so stale copies are made again.
+GENERATOR_VERSION = 1
+
+# Roughly the sizes of the real tables, which scale 1 reproduces.
+NUM_OBJECTS = 1800
+NUM_OBSERVATIONS = 1900
+NUM_PROGRAM_ENTRIES = 3200
+NUM_STARS = 9100
+
+OBJECT_TYPES = ["Gal", "OCl", "GCl", "PN", "EN", "RN", "Ast", "Double", "Carbon", "Gal+OCl"]
+# the scopes (and focal lengths, in mm) validate_observations knows
+SCOPES = [("Meade Infinity 80", 400), ("SV Access 80", 560), ("Omni XLT 150", 750), ("Dobstuff 10", 1125)]
+EYEPIECES = [32, 25, 20, 15, 10, 8, 5]
+LOCATIONS = ["Bellevue at home", "Eastgate", "Rattlesnake Lake", "Goldendale"]
+SEEING = ["P", "F", "G", "VG", "E"]
+
+
+def random_position(rng: random.Random) -> Tuple[float, float]:
+    """An (ra, dec) position, uniformly distributed over the sky."""
+    return (rng.uniform(0.0, 24.0), math.degrees(math.asin(rng.uniform(-1.0, 1.0))))
+
+
+def format_ra(hours: float, compact: bool = False) -> str:
+    """Formats ra like objects.tsv (02h 30m 00s), or stars.tsv (023000.0) if compact."""
+    tenths = int(hours * 36000) % (24 * 36000)
+    (h, rest) = divmod(tenths, 36000)
+    (m, tenths) = divmod(rest, 600)
+    if compact:
+        return "{:02d}{:02d}{:04.1f}".format(h, m, tenths / 10.0)
+    return "{:02d}h {:02d}m {:02d}s".format(h, m, tenths // 10)
+
+
+def format_dec(degrees: float, compact: bool = False) -> str:
+    """Formats dec like objects.tsv (-05° 35' 00"), or stars.tsv (-053500) if compact."""
+    seconds = min(int(abs(degrees) * 3600), 90 * 3600)
+    (d, rest) = divmod(seconds, 3600)
+    (m, s) = divmod(rest, 60)
+    if compact:
+        return "{}{:02d}{:02d}{:02d}".format('-' if degrees < 0 else '+', d, m, s)
+    return "{}{:02d}° {:02d}' {:02d}\"".format('-' if degrees < 0 else '', d, m, s)
+
+
+def object_ids(scale: int) -> List[str]:
+    return ["SYN {}".format(i + 1) for i in range(NUM_OBJECTS * scale)]
+
+
+def write_objects(obj_file: str, scale: int, rng: random.Random) -> None:
+    with open(obj_file, 'w') as out:
+        out.write(format_header(OBJECTS) + '\n')
+        for obj_id in object_ids(scale):
+            if rng.random() < 0.1:
+                # some objects, like planets, have no fixed position
+                (ra, dec) = ('', '')
+            else:
+                (ra_hours, dec_degrees) = random_position(rng)
+                (ra, dec) = (format_ra(ra_hours), format_dec(dec_degrees))
+            fields = [obj_id, obj_id, rng.choice(OBJECT_TYPES), "And", ra, dec,
+                      "{:.1f}".format(rng.uniform(4.0, 14.0)), "{}'".format(rng.randint(1, 60)),
+                      '', '', '', '', "synthetic object"]
+            out.write('\t'.join(fields) + '\n')
+
+
+def write_observations(obs_file: str, scale: int, rng: random.Random) -> List[Tuple[str, str]]:
+    """Writes observations, in date order.  Returns the (id, object) of each."""
+    ids = object_ids(scale)
+    observed = []
+    date = datetime.date(2017, 10, 27)
+    num_today = 0
+    with open(obs_file, 'w') as out:
+        out.write(format_header(OBSERVATIONS) + '\n')
+        for _ in range(NUM_OBSERVATIONS * scale):
+            if num_today > 0 and rng.random() < 0.15:
+                date += datetime.timedelta(days=rng.randint(1, 5))
+                num_today = 0
+            num_today += 1
+            obj_id = rng.choice(ids)
+            obs_id = "{}-{:02d}-{}".format(date.strftime("%Y%m%d"), num_today % 100,
+                                           obj_id.lower().replace(' ', ''))
+            (scope, focal_length) = rng.choice(SCOPES)
+            eyepiece = rng.choice(EYEPIECES)
+            fields = [obs_id, date.isoformat(), rng.choice(LOCATIONS), scope,
+                      rng.choice(SEEING), str(rng.randint(1, 5)), obj_id,
+                      "{}:{:02d}".format(rng.randint(8, 12), rng.randint(0, 59)),
+                      "Plossl {}mm".format(eyepiece), "{}x".format(int(focal_length / eyepiece + 0.5)),
+                      '', "synthetic observation"]
+            out.write('\t'.join(fields) + '\n')
+            observed.append((obs_id, obj_id))
+    return observed
+
+
+def write_programs(program_file: str, scale: int, observed: List[Tuple[str, str]],
+                   rng: random.Random) -> None:
+    ids = object_ids(scale)
+    entries_per_program = 110
+    with open(program_file, 'w') as out:
+        out.write(format_header(PROGRAMS) + '\n')
+        for i in range(NUM_PROGRAM_ENTRIES * scale):
+            program = "Program {}".format(i // entries_per_program + 1)
+            number = str(i % entries_per_program + 1)
+            if rng.random() < 0.5:
+                (obs_id, obj_id) = rng.choice(observed)
+            else:
+                (obs_id, obj_id) = ('', rng.choice(ids))
+            out.write('\t'.join([program, number, obj_id, obs_id]) + '\n')
+
+
+def write_stars(star_file: str, scale: int, rng: random.Random) -> None:
+    """Writes the real stars (so the constellation lines still work) and
+    enough made up ones, mostly faint, to reach scale times as many."""
+    with open(os.path.join(REAL_SKY_DIR, "stars.tsv"), 'r') as real, open(star_file, 'w') as out:
+        shutil.copyfileobj(real, out)
+        for i in range(NUM_STARS * (scale - 1)):
+            (ra, dec) = random_position(rng)
+            mag = 8.0 - rng.expovariate(1.2)
+            fields = [str(100000 + i), '', '', '', format_ra(ra, True), format_dec(dec, True),
+                      "{:.2f}".format(mag)]
+            out.write('\t'.join(fields) + '\n')
+
+
+def generate(out_dir: str, scale: int, seed: int = 1) -> None:
+    """Writes the files for the given scale, unless they are already there."""
+    stamp_file = os.path.join(out_dir, "GENERATED")
+    stamp = "version {} scale {} seed {}\n".format(GENERATOR_VERSION, scale, seed)
+    try:
+        with open(stamp_file, 'r') as f:
+            if f.read() == stamp:
+                return
+    except OSError:
+        pass
+
+    data_dir = os.path.join(out_dir, "data")
+    sky_dir = os.path.join(out_dir, "skyplot", "data")
+    os.makedirs(data_dir, exist_ok=True)
+    os.makedirs(sky_dir, exist_ok=True)
+
+    rng = random.Random(seed)
+    write_objects(os.path.join(data_dir, "objects.tsv"), scale, rng)
+    observed = write_observations(os.path.join(data_dir, "observations.tsv"), scale, rng)
+    write_programs(os.path.join(data_dir, "programs.tsv"), scale, observed, rng)
+    write_stars(os.path.join(sky_dir, "stars.tsv"), scale, rng)
+    for f in ["constellation_lines.tsv", "milkyway.json"]:
+        shutil.copyfile(os.path.join(REAL_SKY_DIR, f), os.path.join(sky_dir, f))
+
+    with open(stamp_file, 'w') as f:
+        f.write(stamp)
+
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option("-s", "--scale", dest="scale", type="int", default=1,
+                      help="how many times larger than the real data to make the files")
+    parser.add_option("--seed", dest="seed", type="int", default=1,
+                      help="random seed")
+    parser.add_option("-o", "--output_dir", dest="output_dir",
+                      help="directory to write the files in", metavar="DIR")
+    (options, args) = parser.parse_args()
+    if not options.output_dir:
+        parser.error("an output directory must be given.  Run with -h to see usage.")
+
+    generate(options.output_dir, options.scale, options.seed)
@@ -0,0 +1,148 @@
+"""Tests of fold_table: each way of resuming (or not) must give the same
+result as reading the whole table again."""
+import os
+
+from checkpoint import fold_table
+from checkpoint import read_checkpoint
+from tsv_tables import PROGRAMS
+
+HEADER = "#program\tnumber\tobjectId\tobservationId\n"
+KEY = "observed/1"
+
+
+def program_row(n: int, observation_id: str = "") -> str:
+    return "Messier\t{}\tM{}\t{}\n".format(n, n, observation_id)
+
+
+class Counter:
+    """Counts observed objects by program, and the rows it was given."""
+
+    def __init__(self):
+        self.rows_added = 0
+
+    def load(self, saved):
+        return dict(saved) if saved else {}
+
+    def add(self, counts, row):
+        self.rows_added += 1
+        if row.observation_id:
+            counts[row.program] = counts.get(row.program, 0) + 1
+
+    def save(self, counts):
+        return counts
+
+
+def fold(table_file: str, key: str = KEY):
+    counter = Counter()
+    checkpoint_file = table_file + ".checkpoint"
+    result = fold_table(table_file, PROGRAMS, checkpoint_file, key,
+                        counter.load, counter.add, counter.save)
+    return (result, counter.rows_added)
+
+
+def recount(table_file: str):
+    """fold_table's result with no checkpoint to resume from."""
+    with open(table_file, 'rb') as f:
+        contents = f.read()
+    fresh_file = table_file + ".fresh"
+    with open(fresh_file, 'wb') as f:
+        f.write(contents)
+    return fold(fresh_file)[0]
+
+
+def write(table_file: str, text: str, mode: str = 'w') -> None:
+    with open(table_file, mode + 'b') as f:
+        f.write(text.encode('utf-8'))
+
+
+def test_resumes_after_appended_rows(tmp_path):
+    table_file = str(tmp_path / "programs.tsv")
+    write(table_file, HEADER + program_row(1, "1") + program_row(2))
+    fold(table_file)
+    write(table_file, program_row(3, "2") + program_row(4, "3"), 'a')
+    (result, rows_added) = fold(table_file)
+    assert rows_added == 2
+    assert result == recount(table_file) == {"Messier": 3}
+
+
+def test_recounts_when_prefix_changes(tmp_path):
+    table_file = str(tmp_path / "programs.tsv")
+    write(table_file, HEADER + program_row(1, "1") + program_row(2, "2"))
+    fold(table_file)
+    # an edit to an already read row, and a new row
+    write(table_file, HEADER + program_row(1) + program_row(2, "2") + program_row(3, "3"))
+    (result, rows_added) = fold(table_file)
+    assert rows_added == 3
+    assert result == recount(table_file) == {"Messier": 2}
+
+
+def test_partial_last_line_is_not_checkpointed(tmp_path):
+    table_file = str(tmp_path / "programs.tsv")
+    write(table_file, HEADER + program_row(1, "1") + program_row(2, "2").rstrip('\n'))
+    (result, _) = fold(table_file)
+    assert result == recount(table_file) == {"Messier": 2}
+    checkpoint = read_checkpoint(table_file + ".checkpoint")
+    assert checkpoint.offset == len((HEADER + program_row(1, "1")).encode('utf-8'))
+    assert checkpoint.state == {"Messier": 1}
+
+    # the rest of the line is written
+    write(table_file, "\n" + program_row(3, "3"), 'a')
+    (result, rows_added) = fold(table_file)
+    assert rows_added == 2
+    assert result == recount(table_file) == {"Messier": 3}
+
+
+def test_partial_last_line_cut_mid_character(tmp_path):
+    table_file = str(tmp_path / "programs.tsv")
+    write(table_file, HEADER + program_row(1, "1"))
+    with open(table_file, 'ab') as f:
+        f.write("Messier\t2\tM2\tobsé".encode('utf-8')[:-1])
+    (result, _) = fold(table_file)
+    assert result == {"Messier": 1}
+
+    write(table_file, HEADER + program_row(1, "1") + program_row(2, "obsé"))
+    (result, rows_added) = fold(table_file)
+    assert rows_added == 1
+    assert result == recount(table_file) == {"Messier": 2}
+
+
+def test_header_is_carried_over_on_resume(tmp_path):
+    # columns in a different order than PROGRAMS, so the appended rows can
+    # only be read right with the checkpointed header
+    table_file = str(tmp_path / "programs.tsv")
+    write(table_file, "#observationId\tobjectId\tnumber\tprogram\n" + "1\tM1\t1\tMessier\n")
+    fold(table_file)
+    write(table_file, "\tM2\t2\tMessier\n" + "2\tM3\t3\tCaldwell\n", 'a')
+    (result, rows_added) = fold(table_file)
+    assert rows_added == 2
+    assert result == recount(table_file) == {"Messier": 1, "Caldwell": 1}
+
+
+def test_recounts_when_key_changes(tmp_path):
+    table_file = str(tmp_path / "programs.tsv")
+    write(table_file, HEADER + program_row(1, "1") + program_row(2, "2"))
+    fold(table_file)
+    (result, rows_added) = fold(table_file, "observed/2")
+    assert rows_added == 2
+    assert result == recount(table_file) == {"Messier": 2}
+
+
+def test_recounts_when_checkpoint_version_changes(tmp_path, monkeypatch):
+    table_file = str(tmp_path / "programs.tsv")
+    write(table_file, HEADER + program_row(1, "1") + program_row(2, "2"))
+    fold(table_file)
+    monkeypatch.setattr("checkpoint.CHECKPOINT_VERSION", 2)
+    (result, rows_added) = fold(table_file)
+    assert rows_added == 2
+    assert result == recount(table_file) == {"Messier": 2}
+    assert read_checkpoint(table_file + ".checkpoint").version == 2
+
+
+def test_recounts_when_checkpoint_is_unreadable(tmp_path):
+    table_file = str(tmp_path / "programs.tsv")
+    write(table_file, HEADER + program_row(1, "1"))
+    with open(table_file + ".checkpoint", 'w') as f:
+        f.write("{not json")
+    (result, _) = fold(table_file)
+    assert result == recount(table_file) == {"Messier": 1}
+    assert os.path.exists(table_file + ".checkpoint")
@@ -0,0 +1,35 @@
+"""Tests of the RA and Dec parsers."""
+import math
+
+import pytest
+
+from coords import parse_dec
+from coords import parse_dec_column
+from coords import parse_ra
+from coords import parse_ra_column
+
+
+@pytest.mark.parametrize("ra_string", ["02h 30m 00s", "2:30", "+2h30m00s", "02 30 00",
+                                       "023000.0", "2.5"])
+def test_parses_each_layout(ra_string):
+    assert parse_ra(ra_string) == pytest.approx(2.5)
+    assert parse_ra_column([ra_string])[0] == pytest.approx(2.5)
+
+
+def test_parses_dec_marks():
+    assert parse_dec("-05° 35' 00\"") == pytest.approx(-5.0 - 35.0 / 60.0)
+    assert parse_dec("+451345") == pytest.approx(45.0 + 13.0 / 60.0 + 45.0 / 3600.0)
+
+
+@pytest.mark.parametrize("bad", ["1e3", "1x30", "12;30", "02h/30m", "2,30"])
+def test_rejects_other_separators(bad):
+    with pytest.raises(ValueError):
+        parse_ra(bad)
+    assert math.isnan(parse_ra_column([bad, "02h 30m 00s"])[0])
+
+
+def test_rejects_out_of_range():
+    with pytest.raises(ValueError):
+        parse_ra("02h 60m 00s")
+    with pytest.raises(ValueError):
+        parse_dec("+91 00 00")
@@ -0,0 +1,153 @@
+r"""
+Streaming readers for the objects, observations and programs tables.
+
+Each reader is a generator that yields one compact record per data row, so
+a file is read in a single pass without holding all of its lines in memory.
+The first line starting with '#' is taken as the header and columns are
+looked up by name, so the tables may have their columns reordered (or have
+extra columns added) without breaking the tools.  Later lines starting with
+'#' are treated as comments.
+
+Example:
+    for obs in read_observations("../data/observations.tsv"):
+        print(obs.obs_id, obs.date)
+"""
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+
+class ObjectRow(NamedTuple):
+    """A row of objects.tsv."""
+    obj_id: str
+    name: str
+    obj_type: str
+    con: str
+    ra: str
+    dec: str
+    mag: str
+    size: str
+    sep: str
+    pa: str
+    obj_class: str
+    distance: str
+    notes: str
+
+
+class ObservationRow(NamedTuple):
+    """A row of observations.tsv."""
+    obs_id: str
+    date: str
+    location: str
+    scope: str
+    seeing: str
+    transparency: str
+    obj_ids: str
+    time: str
+    eyepiece: str
+    magnification: str
+    lunar_phase: str
+    notes: str
+
+
+class ProgramRow(NamedTuple):
+    """A row of programs.tsv.  observation_id is empty if not yet observed."""
+    program: str
+    number: str
+    obj_id: str
+    observation_id: str
+
+
+class Table(NamedTuple):
+    """Describes a table: its record type and the header name of each field."""
+    row_type: type
+    columns: Tuple[str, ...]
+
+
+OBJECTS = Table(ObjectRow, ("id", "Name", "Type", "Con", "RA", "Dec", "Mag",
+                            "Size", "Sep", "PA", "Class", "Distance", "Notes"))
+OBSERVATIONS = Table(ObservationRow, ("id", "Date", "Location", "Scope",
+                                      "Seeing", "Trans", "ObjIds", "Time",
+                                      "Eyepiece", "Mag", "Phase", "Notes"))
+PROGRAMS = Table(ProgramRow, ("program", "number", "objectId",
+                              "observationId"))
+
+
+def parse_header(line: str) -> List[str]:
+    """Changes a header line like '#id\tName' to a list of column names."""
+    return line.lstrip('#').rstrip('\r\n').split('\t')
+
+
+def column_indices(header: Sequence[str], table: Table) -> List[int]:
+    """Finds the index in the header of each column of the table."""
+    names = [h.strip() for h in header]
+    indices = []
+    for column in table.columns:
+        if column not in names:
+            raise Exception("missing column '{}' in header".format(column))
+        indices.append(names.index(column))
+    return indices
+
+
+def split_fields(line: str, indices: Optional[List[int]], num_columns: int) -> List[str]:
+    """Splits a line into the table's fields, padding missing ones with ''."""
+    fields = line.rstrip('\r\n').split('\t')
+    if indices is None:
+        if len(fields) < num_columns:
+            fields += [''] * (num_columns - len(fields))
+        return fields[:num_columns]
+    return [fields[i] if i < len(fields) else '' for i in indices]
+
+
+def read_table_lines(lines: Iterable[str], table: Table) -> Iterator[NamedTuple]:
+    """Yields a record for each data row of the lines of a table."""
+    num_columns = len(table.columns)
+    make = table.row_type._make
+    indices: Optional[List[int]] = None
+    seen_header = False
+    for line in lines:
+        if line.startswith('#'):
+            if not seen_header:
+                seen_header = True
+                indices = column_indices(parse_header(line), table)
+                if indices == list(range(num_columns)):
+                    # common case: no need to reorder fields
+                    indices = None
+            continue
+        if not line.strip():
+            continue
+        yield make(split_fields(line, indices, num_columns))
+
+
+def read_table(table_file: str, table: Table) -> Iterator[NamedTuple]:
+    """Yields a record for each data row of the file."""
+    with open(table_file, 'r') as f:
+        yield from read_table_lines(f, table)
+
+
+def format_header(table: Table) -> str:
+    """Returns the header line (without newline) for the table."""
+    return '#' + '\t'.join(table.columns)
+
+
+def format_row(row: NamedTuple) -> str:
+    """Returns the tsv line (without newline) for the record."""
+    return '\t'.join(row)
+
+
+def read_objects(object_file: str) -> Iterator[ObjectRow]:
+    """Yields a record for each object in objects.tsv."""
+    return read_table(object_file, OBJECTS)
+
+
+def read_observations(observation_file: str) -> Iterator[ObservationRow]:
+    """Yields a record for each observation in observations.tsv."""
+    return read_table(observation_file, OBSERVATIONS)
+
+
+def read_programs(program_file: str) -> Iterator[ProgramRow]:
+    """Yields a record for each entry in programs.tsv."""
+    return read_table(program_file, PROGRAMS)
+
+
+def parse_obj_ids(obj_ids: str) -> List[str]:
+    """Splits the ObjIds field of an observation, e.g., 'M 81|M 82'."""
+    return obj_ids.split('|')
@@ -3,20 +3,34 @@ Does some simple validation for entries in observations.tsv
 
 Usage:
 python3 validate_observations.py -d ../data/observations.tsv 
+
+Rows that pass are remembered (by a hash of their contents) in a cache
+file next to the observations, so later runs only check new or edited
+rows.  Use --full to check every row again.
 """
 from collections import defaultdict
 from dataclasses import dataclass
 from optparse import OptionParser
-from typing import List, Tuple, Counter, DefaultDict
+from typing import List, Optional, Set, Tuple, Counter, DefaultDict
+import hashlib
+import json
+import os
 import string
 import re
 from decimal import Decimal, ROUND_HALF_UP
 
+from tsv_tables import ObservationRow
+from tsv_tables import format_row
+from tsv_tables import read_observations
+
 YearMonth = Tuple[int, int]
 YearMonthCount = Tuple[int, int, int]
 CountList = List[YearMonthCount]
 ObservationsAndSessionsByMonth = Tuple[CountList, CountList]
 
+# Bump when the checks change, so previously passing rows are checked again.
+VALIDATION_VERSION = 1
+
 class Observation:
     """Class for validatable fields of an obsevation."""
 
@@ -27,14 +41,13 @@ class Observation:
     eyepiece: str
     mag: str
 
-    def __init__(self, line: str):
-        fields: str = line.split('\t')
-        self.obsid = fields[0]
-        self.date = fields[1]
-        self.scope = fields[3]
-        self.objids = fields[6]
-        self.eyepiece = fields[8]
-        self.mag = fields[9]
+    def __init__(self, row: ObservationRow):
+        self.obsid = row.obs_id
+        self.date = row.date
+        self.scope = row.scope
+        self.objids = row.obj_ids
+        self.eyepiece = row.eyepiece
+        self.mag = row.magnification
 
     def get_telescope_focal_length(self) -> int:
         telescopes: Map[str, int] = {"Meade Infinity 80": 400,
@@ -77,7 +90,7 @@ class Observation:
     def check_id_date(self) -> bool:
         id_date_match = re.search(r"(\d\d\d\d\d\d\d\d)-", self.obsid)
         if not id_date_match:
-            # skip header
+            # id is not in the expected form; nothing to compare
             return True
         id_date: str = id_date_match.group(1)
 
@@ -90,7 +103,7 @@ class Observation:
     def check_id_obs(self) -> bool:
         id_objs_match = re.search(r"\d\d\d\d\d\d\d\d-\d\d-(.*)", self.obsid)
         if not id_objs_match:
-            # skip header
+            # id is not in the expected form; nothing to compare
             return True
         id_objs: str = id_objs_match.group(1)
 
@@ -102,28 +115,96 @@ class Observation:
             return False
         return True
 
-        
 
-def validate_observations(obs_file: str):
-    """Validate observations."""
-    ofile = open(obs_file, 'r')
-    lines = ofile.readlines()
-    for line in lines:
-        observation = Observation(line)
-        observation.check_mag()
-        observation.check_id_date()
-        observation.check_id_obs()
 
+def row_hash(row: ObservationRow) -> str:
+    return hashlib.sha1(format_row(row).encode('utf-8')).hexdigest()
 
-if __name__ == "__main__":
-    parser = OptionParser()
+
+def default_cache_file(obs_file: str) -> str:
+    return obs_file + ".validated"
+
+
+def read_cache(cache_file: str) -> Set[str]:
+    """Reads the hashes of rows that passed validation before."""
+    try:
+        with open(cache_file, 'r') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return set()
+    if cache.get("version") != VALIDATION_VERSION:
+        return set()
+    return set(cache.get("valid", []))
+
+
+def write_cache(cache_file: str, valid: Set[str]) -> None:
+    tmp_file = cache_file + ".tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump({"version": VALIDATION_VERSION, "valid": sorted(valid)}, f)
+    os.replace(tmp_file, cache_file)
+
+
+def validate_observations(obs_file: str, cache_file: Optional[str] = None,
+                          full: bool = False) -> int:
+    """Validate observations.  Returns the number of rows with errors.
+
+    If cache_file is given, rows that passed in an earlier run are skipped
+    (unless full is set), and the rows passing now are saved to it.
+    """
+    known_valid: Set[str] = set()
+    if cache_file is not None and not full:
+        known_valid = read_cache(cache_file)
+
+    valid: Set[str] = set()
+    num_errors = 0
+    for row in read_observations(obs_file):
+        key = row_hash(row)
+        if key in known_valid:
+            valid.add(key)
+            continue
+        observation = Observation(row)
+        checks = [observation.check_mag(),
+                  observation.check_id_date(),
+                  observation.check_id_obs()]
+        if all(checks):
+            valid.add(key)
+        else:
+            num_errors += 1
+
+    if cache_file is not None:
+        write_cache(cache_file, valid)
+    return num_errors
+
+
+def parse_options(argv: Optional[List[str]] = None, prog: Optional[str] = None):
+    """Parses (and checks) the command line options."""
+    parser = OptionParser(prog=prog)
     parser.add_option("-d", "--observation_file",
                       dest="observation_file",
                       help="file with observations",
                       metavar="TSV FILE")
-    (options, args) = parser.parse_args()
+    parser.add_option("-c", "--cache_file",
+                      dest="cache_file",
+                      help="file remembering rows that passed (default: observation file + .validated)",
+                      metavar="FILE")
+    parser.add_option("--full",
+                      dest="full", action="store_true", default=False,
+                      help="check all rows, not just new or changed ones")
+    parser.add_option("--no_cache",
+                      dest="no_cache", action="store_true", default=False,
+                      help="don't read or write the cache file")
+    (options, args) = parser.parse_args(argv)
     if not (options.observation_file):
         parser.error("must specify observation file.  Run with -h to see usage.")
+    return options
+
 
-    validate_observations(options.observation_file)
+def main(options) -> None:
+    cache_file = None
+    if not options.no_cache:
+        cache_file = options.cache_file or default_cache_file(options.observation_file)
+    validate_observations(options.observation_file, cache_file, options.full)
 
+
+if __name__ == "__main__":
+    main(parse_options())
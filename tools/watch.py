@@ -0,0 +1,299 @@
+r"""
+Watches the data files and redraws the charts that depend on them.
+
+The charts to keep up to date are listed in a tab-separated config file,
+one per line:
+    kind  output  source  [options]
+where kind is one of
+    observations  source is observations.tsv; a chart of observations by month
+    sessions      source is observations.tsv; a chart of sessions by month
+    progress      source is programs.tsv; options is the program name
+    chart         source is a list of object ids; options are the width and
+                  height (default 1280 800); output may be a comma-separated
+                  list of FILE[:SCALE], each drawn as png, pdf or svg by
+                  extension (see chart_outputs.py)
+Relative paths are relative to the config file, and lines starting with '#'
+are comments.  For example:
+    observations  charts/obs.png       ../data/observations.tsv
+    progress      charts/messier.png   ../data/programs.tsv   Messier OP
+    chart         charts/h400.pdf,charts/h400@2x.png:2   h400_ids.txt
+
+The files are polled, and once a change has settled (see --debounce) only
+the charts depending on the changed files are considered.  Of those, a chart
+is only redrawn if the data it shows changed: e.g., fixing the notes of an
+observation does not redraw the monthly charts.  Parsed files and catalogs
+stay in memory between rebuilds, and what each chart was last drawn from is
+saved to config + ".state" so restarting does not redraw everything.
+
+Usage:
+python3 watch.py -c charts.tsv
+python3 watch.py -c charts.tsv --once
+"""
+import hashlib
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass
+from dataclasses import field
+from optparse import OptionParser
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from aggregate import aggregate
+from aggregate import BY_MONTH
+from aggregate import SESSIONS_BY_MONTH
+from tsv_tables import read_observations
+
+SKYPLOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "skyplot")
+KINDS = ["observations", "sessions", "progress", "chart"]
+
+FileStamp = Optional[Tuple[int, int]]
+
+
+@dataclass
+class Target:
+    kind: str
+    output: str
+    source: str
+    options: List[str] = field(default_factory=list)
+
+
+def read_config(config_file: str) -> List[Target]:
+    base_dir = os.path.dirname(os.path.abspath(config_file))
+    targets = []
+    with open(config_file, 'r') as cfile:
+        for line in cfile:
+            if line.startswith('#') or not line.strip():
+                continue
+            fields = [f for f in line.rstrip('\r\n').split('\t') if f]
+            if len(fields) < 3 or fields[0] not in KINDS:
+                raise Exception("bad config line: " + line.strip())
+            if fields[0] == "chart":
+                output = ",".join(os.path.join(base_dir, f) for f in fields[1].split(',') if f)
+            else:
+                output = os.path.join(base_dir, fields[1])
+            target = Target(fields[0], output, os.path.join(base_dir, fields[2]), fields[3:])
+            if target.kind == "progress" and not target.options:
+                raise Exception("progress chart needs a program name: " + line.strip())
+            targets.append(target)
+    return targets
+
+
+def file_stamp(file: str) -> FileStamp:
+    """Size and modification time of a file, or None if it does not exist."""
+    try:
+        st = os.stat(file)
+    except OSError:
+        return None
+    return (st.st_size, st.st_mtime_ns)
+
+
+def sky_catalog_files() -> List[str]:
+    data_dir = os.path.join(SKYPLOT_DIR, "data")
+    return [os.path.join(data_dir, f) for f in ["stars.tsv", "constellation_lines.tsv", "milkyway.json"]]
+
+
+def objects_file() -> str:
+    return os.path.join(SKYPLOT_DIR, "..", "..", "data", "objects.tsv")
+
+
+def output_files(target: Target) -> List[str]:
+    if target.kind == "chart":
+        from chart_outputs import parse_output_specs
+        return [o.file for o in parse_output_specs(target.output, "pdf")]
+    return [target.output]
+
+
+def input_files(target: Target) -> List[str]:
+    if target.kind == "chart":
+        return [target.source, objects_file()] + sky_catalog_files()
+    return [target.source]
+
+
+class WarmData:
+    """Parsed input files, kept between rebuilds.
+
+    Each value is parsed again only when one of the files it came from
+    changes, so a rebuild after editing observations.tsv does not re-read
+    the star catalog, and charts sharing an input parse it once.
+    """
+
+    def __init__(self):
+        self.values: Dict[Tuple[str, ...], Tuple[List[FileStamp], Any]] = {}
+        self.background = None
+        self.glyphs = None
+
+    def get(self, files: List[str], parse: Callable[[], Any], name: str = "") -> Any:
+        """The value parse() returns, parsed again only if files changed.
+        name tells apart different values parsed from the same files."""
+        key = (name,) + tuple(files)
+        stamps = [file_stamp(f) for f in files]
+        if key in self.values and self.values[key][0] == stamps:
+            return self.values[key][1]
+        value = parse()
+        self.values[key] = (stamps, value)
+        return value
+
+    def month_counts(self, obs_file: str):
+        def parse():
+            counts = aggregate(read_observations(obs_file), [BY_MONTH, SESSIONS_BY_MONTH])
+            return {name: [(y, m, c[(y, m)]) for (y, m) in sorted(c)] for name, c in counts.items()}
+        return self.get([obs_file], parse, "month counts")
+
+    def program_dates(self, program_file: str):
+        from progress import get_dates_seen_by_program
+        return self.get([program_file], lambda: get_dates_seen_by_program(program_file),
+                        "program dates")
+
+    def sky(self):
+        if SKYPLOT_DIR not in sys.path:
+            sys.path.append(SKYPLOT_DIR)
+        from dso import read_dso_data
+        from sky_data import load_sky_data
+        sky = self.get(sky_catalog_files(), load_sky_data, "sky")
+        sky.dso_data = self.get([objects_file()], lambda: read_dso_data(objects_file()), "dso data")
+        return sky
+
+
+def chart_size(target: Target) -> Tuple[int, int]:
+    if len(target.options) >= 2:
+        return (int(target.options[0]), int(target.options[1]))
+    return (1280, 800)
+
+
+def fingerprint(target: Target, data: WarmData) -> str:
+    """Hash of exactly the data a chart shows, and how it is drawn."""
+    if target.kind in ["observations", "sessions"]:
+        name = BY_MONTH.name if target.kind == "observations" else SESSIONS_BY_MONTH.name
+        shown = data.month_counts(target.source)[name]
+    elif target.kind == "progress":
+        dates = data.program_dates(target.source).get(target.options[0], {})
+        shown = sorted(dates.items())
+    else:
+        sky = data.sky()
+        from dso import read_object_list
+        ids = read_object_list(target.source)
+        shown = [sky.version, chart_size(target), [(i, sky.dso_data.get(i)) for i in ids]]
+    return hashlib.sha1(repr(shown).encode('utf-8')).hexdigest()
+
+
+def render(target: Target, data: WarmData) -> None:
+    if target.kind in ["observations", "sessions"]:
+        from gen_frequency_charts import SquareChart
+        if target.kind == "observations":
+            chart = SquareChart(data.month_counts(target.source)[BY_MONTH.name],
+                                "Number of Observations", width=600)
+        else:
+            chart = SquareChart(data.month_counts(target.source)[SESSIONS_BY_MONTH.name],
+                                "Number of Observing Sessions", width=600)
+        chart.create_plot(target.output)
+    elif target.kind == "progress":
+        from progress import cumulative_counts
+        from progress import save_plot
+        program_name = target.options[0]
+        (dates, counts) = cumulative_counts(data.program_dates(target.source).get(program_name, {}))
+        save_plot(dates, counts, program_name, target.output)
+    else:
+        from chart_generator import ChartJob
+        from chart_generator import render as render_chart
+        from dso_glyphs import GlyphCache
+        from star_chart import BackgroundCache
+        if data.background is None:
+            data.background = BackgroundCache()
+            data.glyphs = GlyphCache()
+        (width, height) = chart_size(target)
+        job = ChartJob(target.source, target.output, width, height)
+        render_chart(job, data.sky(), data.background, data.glyphs)
+
+
+def read_state(state_file: str) -> Dict[str, str]:
+    try:
+        with open(state_file, 'r') as sfile:
+            return json.load(sfile)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_state(state_file: str, state: Dict[str, str]) -> None:
+    tmp_file = state_file + ".tmp"
+    with open(tmp_file, 'w') as sfile:
+        json.dump(state, sfile, indent=1, sort_keys=True)
+    os.replace(tmp_file, state_file)
+
+
+def rebuild(targets: List[Target], data: WarmData, state: Dict[str, str]) -> int:
+    """Redraws the targets whose data changed.  Returns the number redrawn."""
+    num_drawn = 0
+    for target in targets:
+        try:
+            fp = fingerprint(target, data)
+            if state.get(target.output) == fp and all(os.path.exists(f) for f in output_files(target)):
+                continue
+            render(target, data)
+        except Exception as e:
+            # e.g., a file saved half way through an edit; try again next change
+            print("error drawing {}: {}".format(target.output, e))
+            continue
+        state[target.output] = fp
+        num_drawn += 1
+        print("wrote " + target.output)
+    return num_drawn
+
+
+def wait_until_settled(files: List[str], debounce: float) -> Dict[str, FileStamp]:
+    """Waits until none of the files has changed for debounce seconds."""
+    stamps = {f: file_stamp(f) for f in files}
+    while True:
+        time.sleep(debounce)
+        now = {f: file_stamp(f) for f in files}
+        if now == stamps:
+            return now
+        stamps = now
+
+
+def watch(config_file: str, interval: float, debounce: float, once: bool) -> None:
+    targets = read_config(config_file)
+    state_file = config_file + ".state"
+    state = read_state(state_file)
+    data = WarmData()
+
+    # which targets depend on each file
+    dependents: Dict[str, List[Target]] = {}
+    for target in targets:
+        for f in input_files(target):
+            dependents.setdefault(f, []).append(target)
+    files = list(dependents)
+
+    stamps = {f: file_stamp(f) for f in files}
+    if rebuild(targets, data, state):
+        write_state(state_file, state)
+    if once:
+        return
+
+    while True:
+        time.sleep(interval)
+        if all(file_stamp(f) == stamps[f] for f in files):
+            continue
+        settled = wait_until_settled(files, debounce)
+        changed = [f for f in files if settled[f] != stamps[f]]
+        stamps = settled
+        affected = [t for t in targets if any(t in dependents[f] for f in changed)]
+        if rebuild(affected, data, state):
+            write_state(state_file, state)
+
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option("-c", "--config_file", dest="config_file",
+                      help="list of charts to keep up to date", metavar="TSV FILE")
+    parser.add_option("--interval", dest="interval", type="float", default=1.0,
+                      help="seconds between checks for changed files")
+    parser.add_option("--debounce", dest="debounce", type="float", default=0.5,
+                      help="seconds files must be unchanged before redrawing")
+    parser.add_option("--once", dest="once", action="store_true", default=False,
+                      help="redraw what is out of date and exit")
+    (options, args) = parser.parse_args()
+    if not options.config_file:
+        parser.error("a config file must be given.  Run with -h to see usage.")
+
+    watch(options.config_file, options.interval, options.debounce, options.once)